@@ -24,13 +24,19 @@ Usage:
 
 import asyncio
 import os
-import atexit
+import signal
+import traceback
 from dotenv import load_dotenv
 import discord
 from discord.ext import commands
 
-from database import DB_NAME, init_db
-from prices import preload_price_cache, persist_price_cache
+from database import DB_NAME, init_db, close_db
+from prices import (
+    preload_price_cache,
+    preload_company_name_cache,
+    persist_price_cache,
+    close_http_session,
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -42,27 +48,47 @@ intents.message_content = True  # Required for reading command messages
 bot = commands.Bot(command_prefix="!", intents=intents)
 
 
-@bot.event
-async def on_ready() -> None:
+# Background startup task; kept referenced so it is not garbage collected
+_startup_task: asyncio.Task | None = None
+
+
+async def _post_ready_init() -> None:
     """
-    Initialize the bot when it successfully connects to Discord.
+    Run the heavy startup work after Discord has seen READY.
     
-    This event handler:
+    This task:
     1. Initializes the SQLite database schema
-    2. Preloads the price cache from database for performance
-    3. Loads all command cogs (trading, stats, admin)
-    4. Logs successful startup with database path
+    2. Preloads the price and company name caches while loading the command cogs
+    3. Logs successful startup with database path
     
-    Raises:
-        Exception: If database initialization or cog loading fails
+    Any failure is logged with its traceback and closes the bot, rather than
+    leaving it connected without its database or commands.
     """
-    await init_db()
-    await preload_price_cache()
+    try:
+        await init_db()
+        
+        # Warm the caches alongside cog loading; price lookups that miss
+        # the cache wait for the preload instead of blocking startup. Every
+        # step runs to completion so none is still using the database when
+        # a failure closes the bot.
+        results = await asyncio.gather(
+            preload_price_cache(),
+            preload_company_name_cache(),
+            bot.load_extension("commands.trading"),
+            bot.load_extension("commands.stats"),
+            bot.load_extension("commands.admin"),
+            return_exceptions=True,
+        )
+        failures = [result for result in results if isinstance(result, BaseException)]
+    except Exception as e:
+        failures = [e]
     
-    # Load command modules using async extension loading
-    await bot.load_extension("commands.trading")
-    await bot.load_extension("commands.stats") 
-    await bot.load_extension("commands.admin")
+    if failures:
+        for error in failures:
+            print(f"❌ Bot startup failed: {error!r}")
+            traceback.print_exception(error)
+        await bot.close()
+        return
     
     print(f"🤖 Market Sim Bot ready! Logged in as {bot.user}")
     print(f"📊 Database: {DB_NAME}")
@@ -70,22 +96,56 @@ async def on_ready() -> None:
     print(f"📈 Ready to simulate trading in {len(bot.guilds)} server(s)")
 
 
+@bot.event
+async def on_ready() -> None:
+    """
+    Start background initialization when the bot connects to Discord.
+    
+    The handler returns immediately so the gateway heartbeat is never
+    starved; database setup, cache preloading and cog loading run in
+    _post_ready_init. on_ready also fires on reconnects, so the task is
+    only started once.
+    """
+    global _startup_task
+    if _startup_task is None:
+        _startup_task = asyncio.create_task(_post_ready_init())
+
+
 async def shutdown() -> None:
     """
     Gracefully shutdown the bot and persist cached data.
     
     This function ensures that:
     - All cached prices are saved to the database
-    - Resources are properly cleaned up
+    - The shared HTTP session and database connection are closed
     - No data is lost during shutdown
     """
     print("🔄 Shutting down bot, persisting cache...")
     await persist_price_cache()
+    await close_http_session()
+    await close_db()
     print("✅ Cache persisted successfully")
 
 
-# Register shutdown handler for graceful termination
-atexit.register(lambda: asyncio.run(persist_price_cache()))
+async def _run_bot(token: str) -> None:
+    """
+    Run the bot until it is closed, then shut down exactly once.
+    
+    SIGINT/SIGTERM close the Discord connection, which makes bot.start()
+    return so shutdown() persists the cache on the same event loop.
+    """
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.create_task(bot.close()))
+        except NotImplementedError:
+            pass  # Signal handlers are unavailable on Windows event loops
+    
+    try:
+        async with bot:
+            await bot.start(token)
+    finally:
+        await shutdown()
 
 
 def main() -> None:
@@ -109,7 +169,8 @@ def main() -> None:
     
     try:
         print("🚀 Starting Market Sim Discord Bot...")
-        bot.run(TOKEN)
+        discord.utils.setup_logging()
+        asyncio.run(_run_bot(TOKEN))
     except discord.LoginFailure:
         print("❌ Failed to login to Discord. Please check your TOKEN in .env")
         raise
@@ -6,50 +6,49 @@ Removes test/demo users and ensures data consistency.
 
 import asyncio
 import sqlite3
-import aiosqlite
-from database import DB_NAME
+from database import get_db, transaction, close_db
 
 # Known test/demo user patterns to remove
-TEST_USER_PATTERNS = [
+TEST_USER_PATTERNS = frozenset({
     'test_user_12345',
     'TestUser', 
     'Test Trader',
     'Demo User',
     'demo_user'
-]
+})
 
 # Specific test user IDs to remove
-SPECIFIC_TEST_USERS = [
+SPECIFIC_TEST_USERS = frozenset({
     'test_user_12345'
-]
+})
 
 # Known real Discord user IDs to keep
-REAL_USERS = [
+REAL_USERS = frozenset({
     '419660638881579028',  # Qais
     '236917392918183937',  # Jack  
     '1364782232761405470'  # Peter
-]
+})
+
+# Users, holdings and history in one query; the first column names the
+# table and shorter rows are padded with NULL
+CONTENTS_QUERY = """
+    SELECT 'users', user_id, username, cash, initial_value FROM users
+    UNION ALL
+    SELECT 'holdings', user_id, symbol, shares, NULL FROM holdings
+    UNION ALL
+    SELECT 'history', user_id, date, portfolio_value, NULL FROM history
+"""
+
+# Number of real columns each table contributes to CONTENTS_QUERY
+CONTENTS_WIDTHS = {'users': 4, 'holdings': 3, 'history': 3}
 
 async def check_database_contents() -> dict:
     """Check current database contents."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        # Get all users
-        async with db.execute("SELECT user_id, username, cash, initial_value FROM users") as cur:
-            users = await cur.fetchall()
-        
-        # Get all holdings
-        async with db.execute("SELECT user_id, symbol, shares FROM holdings") as cur:
-            holdings = await cur.fetchall()
-            
-        # Get all history
-        async with db.execute("SELECT user_id, date, portfolio_value FROM history") as cur:
-            history = await cur.fetchall()
-    
-    return {
-        'users': users,
-        'holdings': holdings, 
-        'history': history
-    }
+    db = await get_db()
+    contents: dict[str, list] = {table: [] for table in CONTENTS_WIDTHS}
+    for table, *row in await db.execute_fetchall(CONTENTS_QUERY):
+        contents[table].append(tuple(row[:CONTENTS_WIDTHS[table]]))
+    return contents
 
 def identify_test_users(users: list) -> list:
     """Identify test/demo users that should be removed."""
@@ -57,11 +56,11 @@ def identify_test_users(users: list) -> list:
     
     for user_id, username, cash, initial_value in users:
         # Check if it's a known real user
-        if user_id in REAL_USERS:
+        if str(user_id) in REAL_USERS:
             continue
             
         # Check specific test user IDs first
-        if user_id in SPECIFIC_TEST_USERS:
+        if str(user_id) in SPECIFIC_TEST_USERS:
             test_users.append(user_id)
             continue
             
@@ -78,36 +77,28 @@ async def remove_test_users(test_user_ids: list) -> None:
         print("✅ No test users found to remove")
         return
         
-    async with aiosqlite.connect(DB_NAME) as db:
-        for user_id in test_user_ids:
-            print(f"🗑️  Removing test user: {user_id}")
-            
-            # Remove from holdings
-            await db.execute("DELETE FROM holdings WHERE user_id = ?", (user_id,))
-            
-            # Remove from history
-            await db.execute("DELETE FROM history WHERE user_id = ?", (user_id,))
-            
-            # Remove from users
-            await db.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
-        
-        await db.commit()
-        print(f"✅ Removed {len(test_user_ids)} test users")
+    for user_id in test_user_ids:
+        print(f"🗑️  Removing test user: {user_id}")
+    
+    # One DELETE per table covers every test user
+    placeholders = ",".join("?" * len(test_user_ids))
+    async with transaction() as db:
+        for table in ("holdings", "history", "users"):
+            await db.execute(f"DELETE FROM {table} WHERE user_id IN ({placeholders})", test_user_ids)
+    
+    print(f"✅ Removed {len(test_user_ids)} test users")
 
 async def verify_user_consistency() -> None:
     """Verify user_id consistency across all tables."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        # Get all user_ids from users table
-        async with db.execute("SELECT user_id FROM users") as cur:
-            user_ids = {row[0] for row in await cur.fetchall()}
+    db = await get_db()
+    # Get all user_ids from users table
+    user_ids = {row[0] for row in await db.execute_fetchall("SELECT user_id FROM users")}
         
-        # Check holdings table
-        async with db.execute("SELECT DISTINCT user_id FROM holdings") as cur:
-            holdings_user_ids = {row[0] for row in await cur.fetchall()}
+    # Check holdings table
+    holdings_user_ids = {row[0] for row in await db.execute_fetchall("SELECT DISTINCT user_id FROM holdings")}
             
-        # Check history table
-        async with db.execute("SELECT DISTINCT user_id FROM history") as cur:
-            history_user_ids = {row[0] for row in await cur.fetchall()}
+    # Check history table
+    history_user_ids = {row[0] for row in await db.execute_fetchall("SELECT DISTINCT user_id FROM history")}
     
     print(f"📊 Users table: {len(user_ids)} users")
     print(f"📊 Holdings table: {len(holdings_user_ids)} unique users")
@@ -127,32 +118,14 @@ async def verify_user_consistency() -> None:
 
 async def cleanup_orphaned_records() -> None:
     """Remove any orphaned records from holdings and history tables."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        # Get valid user_ids
-        async with db.execute("SELECT user_id FROM users") as cur:
-            valid_user_ids = {row[0] for row in await cur.fetchall()}
-        
-        # Remove orphaned holdings
-        async with db.execute("SELECT DISTINCT user_id FROM holdings") as cur:
-            holdings_user_ids = {row[0] for row in await cur.fetchall()}
-        
-        orphaned_holdings = holdings_user_ids - valid_user_ids
-        if orphaned_holdings:
-            for user_id in orphaned_holdings:
-                await db.execute("DELETE FROM holdings WHERE user_id = ?", (user_id,))
-            print(f"🗑️  Removed orphaned holdings for {len(orphaned_holdings)} users")
-        
-        # Remove orphaned history  
-        async with db.execute("SELECT DISTINCT user_id FROM history") as cur:
-            history_user_ids = {row[0] for row in await cur.fetchall()}
-            
-        orphaned_history = history_user_ids - valid_user_ids
-        if orphaned_history:
-            for user_id in orphaned_history:
-                await db.execute("DELETE FROM history WHERE user_id = ?", (user_id,))
-            print(f"🗑️  Removed orphaned history for {len(orphaned_history)} users")
-        
-        await db.commit()
+    async with transaction() as db:
+        # Let SQLite find and delete the orphans in one statement per table
+        for table in ("holdings", "history"):
+            cursor = await db.execute(
+                f"DELETE FROM {table} WHERE user_id NOT IN (SELECT user_id FROM users)"
+            )
+            if cursor.rowcount:
+                print(f"🗑️  Removed {cursor.rowcount} orphaned {table} records")
 
 async def main() -> None:
     """Main cleanup function."""
@@ -199,5 +172,12 @@ async def main() -> None:
     
     print(f"\n🎉 Database cleanup completed successfully!")
 
+async def run() -> None:
+    """Run the cleanup and close the shared database connection."""
+    try:
+        await main()
+    finally:
+        await close_db()
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run())
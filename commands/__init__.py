@@ -1,5 +1,23 @@
-from .trading import TradingCog
-from .stats import StatsCog
-from .admin import AdminCog
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .trading import TradingCog
+    from .stats import StatsCog
+    from .admin import AdminCog
 
 __all__ = ["TradingCog", "StatsCog", "AdminCog"]
+
+# Cog modules are imported on first access so bot.load_extension() only
+# imports the extension it is loading, not every cog in the package
+_COG_MODULES = {
+    "TradingCog": ".trading",
+    "StatsCog": ".stats",
+    "AdminCog": ".admin",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _COG_MODULES:
+        return getattr(importlib.import_module(_COG_MODULES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -11,6 +11,7 @@ Commands Provided:
 - !flushcache: Persist cached prices to database
 - !clearcache: Clear in-memory price cache
 - !reloadcache: Reload price cache from database
+- !cachestats: Show price cache hit rates since startup
 
 Features:
 - Administrator permission checking for security
@@ -35,22 +36,22 @@ These commands are typically used by bot administrators to:
 from discord.ext import commands
 import discord
 import os
-import aiosqlite
-from datetime import date
 from typing import List, Optional, Any
 
 from database import (
-    get_all_users,
-    get_holdings,
-    record_history,
+    get_all_portfolios,
+    record_daily_values,
 )
 from prices import (
-    get_price,
+    get_prices,
+    holdings_values,
     persist_price_cache,
     preload_price_cache,
     clear_price_cache,
+    price_cache,
+    cache_stats,
 )
-from database import DB_NAME
+from .users import resolve_users
 
 
 class AdminCog(commands.Cog):
@@ -71,41 +72,36 @@ class AdminCog(commands.Cog):
         """
         self.bot = bot
 
-    async def _portfolio_update(self) -> list[str]:
-        """Compute daily portfolio values and return summary lines."""
+    async def _portfolio_update(self, guild: Optional[discord.Guild] = None) -> list[str]:
+        """
+        Compute daily portfolio values and return summary lines.
+        
+        Args:
+            guild: Guild whose cached members are used to resolve user names
+        """
         await preload_price_cache()
         lines: list[str] = []
-        async with aiosqlite.connect(DB_NAME) as db:
-            async with db.execute(
-                "SELECT user_id, cash, last_value, initial_value FROM users"
-            ) as cursor:
-                users = await cursor.fetchall()
-
-            for user_id, cash, last_val, initial in users:
-                async with db.execute(
-                    "SELECT symbol, shares FROM holdings WHERE user_id = ?",
-                    (user_id,),
-                ) as hcur:
-                    holdings = await hcur.fetchall()
-
-                holdings_value = 0
-                for symbol, shares in holdings:
-                    price = await get_price(symbol)
-                    if price:
-                        holdings_value += shares * price
-                
-                total_value = cash + holdings_value
-                await db.execute(
-                    "UPDATE users SET last_value = ? WHERE user_id = ?",
-                    (total_value, user_id),
-                )
-                await record_history(user_id, total_value)
-                total_gain = ((total_value - initial) / initial) * 100
-                user = await self.bot.fetch_user(int(user_id))
-                lines.append(
-                    f"{user.name}: Holdings ${holdings_value:,.2f} | Cash ${cash:,.2f} | All-time ROI {total_gain:+.2f}%"
-                )
-            await db.commit()
+        portfolios = await get_all_portfolios()
+        prices = await get_prices(
+            symbol for *_, holdings in portfolios for symbol, _ in holdings
+        )
+
+        users = await resolve_users(self.bot, (row[0] for row in portfolios), guild)
+
+        snapshots: list[tuple[int, float]] = []
+        values = holdings_values(portfolios, prices)
+        for (user_id, cash, initial, _, _), holdings_value in zip(portfolios, values):
+            holdings_value = float(holdings_value)
+            total_value = cash + holdings_value
+            snapshots.append((user_id, total_value))
+            total_gain = ((total_value - initial) / initial) * 100
+            user = users[user_id]
+            name = user.name if user else f"User {user_id}"
+            lines.append(
+                f"{name}: Holdings ${holdings_value:,.2f} | Cash ${cash:,.2f} | All-time ROI {total_gain:+.2f}%"
+            )
+
+        await record_daily_values(snapshots)
         return lines
 
     @commands.command(name="daily_update")
@@ -116,7 +112,7 @@ class AdminCog(commands.Cog):
         channel = (
             self.bot.get_channel(int(channel_id)) if channel_id else ctx.channel
         )
-        lines = await self._portfolio_update()
+        lines = await self._portfolio_update(getattr(channel, "guild", None))
         if not lines:
             await ctx.send("No users found.")
             return
@@ -144,6 +140,21 @@ class AdminCog(commands.Cog):
         await preload_price_cache()
         await ctx.send("Price cache reloaded from database.")
 
+    @commands.command(name="cachestats")
+    @commands.has_permissions(administrator=True)
+    async def show_cache_stats(self, ctx: commands.Context) -> None:
+        """Show how price lookups have been served since startup."""
+        total = sum(cache_stats.values())
+        if not total:
+            await ctx.send("No price lookups yet.")
+            return
+        await ctx.send(
+            f"📊 Price cache: {len(price_cache)} entries | "
+            f"fresh {cache_stats['fresh']} ({cache_stats['fresh'] / total:.0%}) | "
+            f"stale {cache_stats['stale']} ({cache_stats['stale'] / total:.0%}) | "
+            f"miss {cache_stats['miss']} ({cache_stats['miss'] / total:.0%})"
+        )
+
 
 async def setup(bot: commands.Bot) -> None:
     """Cog loader for AdminCog."""
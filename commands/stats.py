@@ -30,19 +30,114 @@ Technical Implementation:
 
 from discord.ext import commands
 import discord
-import matplotlib.pyplot as plt
+import numpy as np
+import asyncio
 import io
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Optional, Any
-from datetime import datetime
 
 from database import (
-    get_holdings,
-    get_cash,
-    get_user,
-    get_all_users,
+    get_portfolio,
+    get_all_portfolios,
     get_history,
+    get_market_totals,
 )
-from prices import get_price, get_company_name
+from prices import get_prices, get_company_names, holdings_values
+from .users import resolve_users
+
+
+# One reusable figure for !chart drawn straight on an Agg canvas, bypassing
+# pyplot's global state. Built by the first render so matplotlib is only
+# imported once someone asks for a chart.
+_chart_fig: Any = None
+_chart_ax: Any = None
+_currency_formatter: Any = None
+# PNG output buffer reused across renders (safe: renders never overlap)
+_chart_buffer = io.BytesIO()
+# Renders run on a dedicated single worker: it serializes access to the shared
+# figure and keeps the default executor free for aiohttp's DNS lookups
+_chart_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart")
+
+# Leaderboard rank labels, built once rather than per row
+_RANK_LABELS = ("🥇", "🥈", "🥉") + tuple(f"{i}." for i in range(4, 11))
+
+# Longer histories are downsampled to about one point per horizontal pixel
+# of the rendered chart (10 inches at 150 dpi)
+_CHART_MAX_POINTS = 1500
+
+
+def _lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Pick n_out indices that preserve a series' visual shape (Largest-Triangle-Three-Buckets).
+    
+    The first and last points are always kept. Every point in between falls
+    into one of n_out - 2 buckets, and each bucket keeps the point forming
+    the largest triangle with the previously kept point and the next
+    bucket's average.
+    
+    Args:
+        x: Increasing x coordinates as floats
+        y: Values aligned with x
+        n_out: Number of points to keep
+    
+    Returns:
+        Sorted indices into x and y
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    keep = np.empty(n_out, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i == n_out - 3:
+            avg_x, avg_y = x[-1], y[-1]
+        else:
+            avg_x = x[end:edges[i + 2]].mean()
+            avg_y = y[end:edges[i + 2]].mean()
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(areas.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def _render_chart(dates: np.ndarray, values: np.ndarray, title: str) -> bytes:
+    """Render a portfolio value line chart to PNG bytes; runs on _chart_executor."""
+    global _chart_fig, _chart_ax, _currency_formatter
+    if len(values) > _CHART_MAX_POINTS:
+        keep = _lttb(dates.astype(np.int64).astype(float), values, _CHART_MAX_POINTS)
+        dates, values = dates[keep], values[keep]
+    if _chart_fig is None:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        from matplotlib.ticker import FuncFormatter
+
+        _chart_fig = Figure(figsize=(10, 6))
+        FigureCanvasAgg(_chart_fig)
+        _chart_ax = _chart_fig.add_subplot()
+        _currency_formatter = FuncFormatter(lambda x, p: f'${x:,.0f}')
+    ax = _chart_ax
+    ax.cla()
+    ax.plot(dates, values, linewidth=2, color='#00ff88')
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Portfolio Value ($)')
+    ax.grid(True, alpha=0.3)
+    ax.tick_params(axis='x', labelrotation=45)
+
+    # Format y-axis to show currency
+    ax.yaxis.set_major_formatter(_currency_formatter)
+    _chart_fig.tight_layout()
+
+    _chart_buffer.seek(0)
+    _chart_buffer.truncate()
+    _chart_fig.savefig(_chart_buffer, format='png', dpi=150, bbox_inches='tight')
+    return _chart_buffer.getvalue()
 
 
 class StatsCog(commands.Cog):
@@ -64,13 +159,13 @@ class StatsCog(commands.Cog):
     @commands.command(name="portfolio")
     async def portfolio(self, ctx: commands.Context) -> None:
         """Display the user's portfolio with detailed ROI information."""
-        user_id = str(ctx.author.id)
-        rows = await get_holdings(user_id)
-        if not rows:
+        user_id = ctx.author.id
+        portfolio = await get_portfolio(user_id)
+        if not portfolio or not portfolio[2]:
             await ctx.send(f"{ctx.author.mention} you have no holdings.")
             return
 
-        cash = await get_cash(user_id) or 0
+        cash, initial_value, rows = portfolio
         header = f"📊 **{ctx.author.display_name}'s Portfolio**\n"
         total_value = cash
         holdings_lines = []
@@ -79,8 +174,9 @@ class StatsCog(commands.Cog):
         
         # First pass: calculate position values for sorting (minimal API calls)
         position_data = []
+        prices = await get_prices((symbol for symbol, _, _ in rows), allow_stale=True)
         for symbol, shares, avg_price in rows:
-            price = await get_price(symbol)
+            price = prices.get(symbol)
             if not price:
                 continue
                 
@@ -108,8 +204,9 @@ class StatsCog(commands.Cog):
         top_positions = position_data[:5]
         
         # Generate display lines for top 5 positions only
+        company_names = await get_company_names(pos["symbol"] for pos in top_positions)
         for pos in top_positions:
-            company_name = await get_company_name(pos["symbol"])
+            company_name = company_names[pos["symbol"]]
             position_roi = ((pos["current_price"] - pos["avg_price"]) / pos["avg_price"]) * 100 if pos["avg_price"] > 0 else 0
             pnl_symbol = "📈" if pos["unrealized"] >= 0 else "📉"
             
@@ -128,8 +225,6 @@ class StatsCog(commands.Cog):
             holdings_lines.append(f"\n*...and {total_positions - 5} smaller positions*")
 
         holdings_value = total_value - cash
-        user = await get_user(user_id)
-        initial_value = user[2] if user else 1000000
         overall_roi = ((total_value - initial_value) / initial_value) * 100 if initial_value > 0 else 0
         
         # Calculate holdings ROI vs cash allocation
@@ -144,83 +239,77 @@ class StatsCog(commands.Cog):
             f"🏆 **Portfolio ROI**: {overall_roi:+.2f}%"
         )
 
-        message = header + "\n".join(holdings_lines) + f"\n\n{summary}"
+        message = "".join((header, "\n".join(holdings_lines), "\n\n", summary))
         await ctx.send(message)
 
     @commands.command(name="leaderboard")
     async def leaderboard(self, ctx: commands.Context) -> None:
         """Show the top traders ranked by ROI."""
-        users = await get_all_users()
-        if not users:
+        portfolios = await get_all_portfolios()
+        if not portfolios:
             await ctx.send("No users found.")
             return
 
-        # Calculate current portfolio values
-        user_data = []
-        for user_id, cash, initial_value, _ in users:
-            holdings = await get_holdings(user_id)
-            total_value = cash
-
-            for symbol, shares, _ in holdings:
-                price = await get_price(symbol)
-                if price:
-                    total_value += shares * price
-
-            roi = ((total_value - initial_value) / initial_value) * 100 if initial_value > 0 else 0
-            user_data.append((user_id, total_value, roi))
-
-        # Sort by ROI (descending)
-        user_data.sort(key=lambda x: x[2], reverse=True)
-
-        lines = ["🏆 **Market Sim Leaderboard**\n"]
-        for i, (user_id, total_value, roi) in enumerate(user_data[:10], 1):
-            try:
-                user = await self.bot.fetch_user(int(user_id))
-                emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-                lines.append(
-                    f"{emoji} **{user.display_name}**: ${total_value:,.0f} ({roi:+.2f}%)"
-                )
-            except Exception:
-                continue
+        # Fetch every distinct symbol once, concurrently, before valuing portfolios
+        prices = await get_prices(
+            (symbol for *_, holdings in portfolios for symbol, _ in holdings),
+            allow_stale=True,
+        )
 
-        await ctx.send("\n".join(lines))
+        # Value and rank every portfolio as whole arrays; users without an
+        # initial value get an ROI of 0
+        count = len(portfolios)
+        cash = np.fromiter((row[1] for row in portfolios), dtype=float, count=count)
+        initial = np.fromiter((row[2] for row in portfolios), dtype=float, count=count)
+        totals = cash + holdings_values(portfolios, prices)
+        rois = np.divide(
+            totals - initial, initial, out=np.zeros(count), where=initial > 0
+        ) * 100
+
+        # Highest ROI first; the stable sort keeps ties in table order
+        top = np.argsort(-rois, kind="stable")[: len(_RANK_LABELS)]
+
+        ranked = [
+            (emoji, portfolios[i][0], float(totals[i]), float(rois[i]))
+            for emoji, i in zip(_RANK_LABELS, top)
+        ]
+        users = await resolve_users(self.bot, (user_id for _, user_id, _, _ in ranked), ctx.guild)
+
+        # One line per resolvable user, joined once
+        lines = [
+            f"{emoji} **{users[user_id].display_name}**: ${total_value:,.0f} ({roi:+.2f}%)"
+            for emoji, user_id, total_value, roi in ranked
+            if users[user_id] is not None
+        ]
+        await ctx.send("\n".join(["🏆 **Market Sim Leaderboard**\n", *lines]))
 
     @commands.command(name="chart")
     async def chart(self, ctx: commands.Context) -> None:
         """Generate a portfolio performance chart."""
-        user_id = str(ctx.author.id)
+        user_id = ctx.author.id
         history = await get_history(user_id)
         
         if not history:
             await ctx.send(f"{ctx.author.mention} no portfolio history found.")
             return
 
-        # Extract dates and values
-        dates = [date for date, _ in history]
-        values = [value for _, value in history]
-
-        if len(values) < 2:
+        if len(history) < 2:
             await ctx.send(f"{ctx.author.mention} need at least 2 days of history for a chart.")
             return
 
-        # Create the chart
-        plt.figure(figsize=(10, 6))
-        plt.plot(dates, values, linewidth=2, color='#00ff88')
-        plt.title(f"{ctx.author.display_name}'s Portfolio Performance", fontsize=14, fontweight='bold')
-        plt.xlabel('Date')
-        plt.ylabel('Portfolio Value ($)')
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-
-        # Format y-axis to show currency
-        plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
-
-        # Save to bytes
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
-        buffer.seek(0)
-        plt.close()
+        # Columnar arrays for matplotlib: real dates on the x axis, float values
+        dates = np.array([day for day, _ in history], dtype="datetime64[D]")
+        values = np.fromiter((value for _, value in history), dtype=float, count=len(history))
+
+        # Render off the event loop so other commands keep running
+        png = await asyncio.get_running_loop().run_in_executor(
+            _chart_executor,
+            _render_chart,
+            dates,
+            values,
+            f"{ctx.author.display_name}'s Portfolio Performance",
+        )
+        buffer = io.BytesIO(png)
 
         # Send as file
         file = discord.File(buffer, filename=f"{ctx.author.display_name}_portfolio.png")
@@ -229,26 +318,17 @@ class StatsCog(commands.Cog):
     @commands.command(name="stats")
     async def stats(self, ctx: commands.Context) -> None:
         """Show overall market statistics."""
-        users = await get_all_users()
-        if not users:
+        # Per-user detail isn't needed here: SQL sums cash and shares per symbol
+        total_users, total_cash, total_initial, shares_by_symbol = await get_market_totals()
+        if not total_users:
             await ctx.send("No market data available.")
             return
 
-        total_users = len(users)
-        total_aum = 0
-        total_initial = 0
+        prices = await get_prices((symbol for symbol, _ in shares_by_symbol), allow_stale=True)
 
-        for user_id, cash, initial_value, _ in users:
-            holdings = await get_holdings(user_id)
-            current_value = cash
-            
-            for symbol, shares, _ in holdings:
-                price = await get_price(symbol)
-                if price:
-                    current_value += shares * price
-
-            total_aum += current_value
-            total_initial += initial_value
+        total_aum = total_cash + sum(
+            shares * (prices.get(symbol) or 0.0) for symbol, shares in shares_by_symbol
+        )
 
         avg_roi = ((total_aum - total_initial) / total_initial) * 100 if total_initial > 0 else 0
 
@@ -18,7 +18,7 @@ Features:
 - Automatic cost basis calculation with weighted averages
 - Input validation and error handling
 - Discord user integration with proper mentions
-- Company name resolution for better user experience
+- Company name resolution for better user experience (fetched alongside the price)
 
 Architecture:
 - Implements discord.py Cog pattern for modular commands
@@ -29,18 +29,15 @@ Architecture:
 
 from discord.ext import commands
 import discord
+import asyncio
 from typing import Optional
 
 from database import (
     create_user,
-    get_user,
     get_cash,
-    update_cash,
     get_holding,
-    get_holdings,
-    update_holding,
-    insert_holding,
-    delete_holding,
+    record_buy,
+    record_sell,
 )
 from prices import get_price, get_company_name
 
@@ -85,20 +82,19 @@ class TradingCog(commands.Cog):
             User: !join
             Bot: Welcome! You've joined with $1,000,000.00 starting cash.
         """
-        user_id = str(ctx.author.id)
+        user_id = ctx.author.id
         username = ctx.author.display_name
-        if await get_user(user_id):
-            await ctx.send(f"{ctx.author.mention} you already joined!")
-        else:
-            await create_user(user_id, username)
+        if await create_user(user_id, username):
             await ctx.send(
                 f"{ctx.author.mention} welcome! You've been given $1,000,000 virtual cash."
             )
+        else:
+            await ctx.send(f"{ctx.author.mention} you already joined!")
 
     @commands.command(name="balance")
     async def balance(self, ctx: commands.Context) -> None:
         """Show the user's cash balance."""
-        user_id = str(ctx.author.id)
+        user_id = ctx.author.id
         cash = await get_cash(user_id)
         if cash is not None:
             await ctx.send(f"{ctx.author.mention} your current balance is ${cash:,.2f}")
@@ -110,35 +106,27 @@ class TradingCog(commands.Cog):
     @commands.command(name="buy")
     async def buy(self, ctx: commands.Context, symbol: str, quantity: int) -> None:
         """Buy shares of a stock."""
-        user_id = str(ctx.author.id)
+        user_id = ctx.author.id
         if quantity <= 0:
             await ctx.send("Quantity must be greater than 0.")
             return
         symbol = symbol.upper()
-        company_name = await get_company_name(symbol)
-        price = await get_price(symbol)
+        company_name, price = await asyncio.gather(
+            get_company_name(symbol), get_price(symbol)
+        )
         if not price:
             await ctx.send(f"Could not fetch live price for `{symbol}` ({company_name}).")
             return
         cost = price * quantity
-        cash = await get_cash(user_id)
-        if cash is None:
-            await ctx.send("You need to `!join` before trading.")
+        if await record_buy(user_id, symbol, quantity, price) is None:
+            cash = await get_cash(user_id)
+            if cash is None:
+                await ctx.send("You need to `!join` before trading.")
+            else:
+                await ctx.send(
+                    f"❌ **Insufficient funds!** You need ${cost:,.2f} but only have ${cash:,.2f}"
+                )
             return
-        if cash < cost:
-            await ctx.send(
-                f"❌ **Insufficient funds!** You need ${cost:,.2f} but only have ${cash:,.2f}"
-            )
-            return
-        holding = await get_holding(user_id, symbol)
-        if holding:
-            shares, avg = holding
-            total = shares + quantity
-            new_avg = ((shares * avg) + (quantity * price)) / total
-            await update_holding(user_id, symbol, total, new_avg)
-        else:
-            await insert_holding(user_id, symbol, quantity, price)
-        await update_cash(user_id, cash - cost)
         await ctx.send(
             f"✅ {ctx.author.mention} bought **{quantity} shares** of `{symbol}` ({company_name}) at ${price:,.2f} each\n"
             f"💰 Total cost: ${cost:,.2f}"
@@ -147,33 +135,27 @@ class TradingCog(commands.Cog):
     @commands.command(name="sell")
     async def sell(self, ctx: commands.Context, symbol: str, quantity: int) -> None:
         """Sell shares of a stock."""
-        user_id = str(ctx.author.id)
+        user_id = ctx.author.id
         if quantity <= 0:
             await ctx.send("Quantity must be greater than 0.")
             return
         symbol = symbol.upper()
-        company_name = await get_company_name(symbol)
-        price = await get_price(symbol)
+        company_name, price = await asyncio.gather(
+            get_company_name(symbol), get_price(symbol)
+        )
         if not price:
             await ctx.send(f"Could not fetch live price for `{symbol}` ({company_name}).")
             return
-        holding = await get_holding(user_id, symbol)
-        if not holding:
-            await ctx.send(f"❌ You don't own any shares of `{symbol}` ({company_name}).")
-            return
-        shares_owned, avg_price = holding
-        if shares_owned < quantity:
-            await ctx.send(
-                f"❌ You only have **{shares_owned}** shares of `{symbol}` ({company_name}) but tried to sell **{quantity}**."
-            )
+        if await record_sell(user_id, symbol, quantity, price) is None:
+            holding = await get_holding(user_id, symbol)
+            if not holding:
+                await ctx.send(f"❌ You don't own any shares of `{symbol}` ({company_name}).")
+            else:
+                await ctx.send(
+                    f"❌ You only have **{holding[0]}** shares of `{symbol}` ({company_name}) but tried to sell **{quantity}**."
+                )
             return
         proceeds = price * quantity
-        if shares_owned == quantity:
-            await delete_holding(user_id, symbol)
-        else:
-            await update_holding(user_id, symbol, shares_owned - quantity, avg_price)
-        cash = await get_cash(user_id) or 0
-        await update_cash(user_id, cash + proceeds)
         await ctx.send(
             f"✅ {ctx.author.mention} sold **{quantity} shares** of `{symbol}` ({company_name}) at ${price:,.2f} each\n"
             f"💰 Proceeds: ${proceeds:,.2f}"
@@ -182,13 +164,14 @@ class TradingCog(commands.Cog):
     @commands.command(name="USD")
     async def buy_usd(self, ctx: commands.Context, symbol: str, amount: float) -> None:
         """Buy shares using a dollar amount instead of quantity."""
-        user_id = str(ctx.author.id)
+        user_id = ctx.author.id
         if amount <= 0:
             await ctx.send("Amount must be greater than 0.")
             return
         symbol = symbol.upper()
-        company_name = await get_company_name(symbol)
-        price = await get_price(symbol)
+        company_name, price = await asyncio.gather(
+            get_company_name(symbol), get_price(symbol)
+        )
         if not price:
             await ctx.send(f"Could not fetch live price for `{symbol}` ({company_name}).")
             return
@@ -197,24 +180,15 @@ class TradingCog(commands.Cog):
             await ctx.send("Amount too small to buy even one share.")
             return
         actual_cost = shares_possible * price
-        cash = await get_cash(user_id)
-        if cash is None:
-            await ctx.send("You need to `!join` before trading.")
+        if await record_buy(user_id, symbol, shares_possible, price) is None:
+            cash = await get_cash(user_id)
+            if cash is None:
+                await ctx.send("You need to `!join` before trading.")
+            else:
+                await ctx.send(
+                    f"❌ **Insufficient funds!** You need ${actual_cost:,.2f} but only have ${cash:,.2f}"
+                )
             return
-        if cash < actual_cost:
-            await ctx.send(
-                f"❌ **Insufficient funds!** You need ${actual_cost:,.2f} but only have ${cash:,.2f}"
-            )
-            return
-        holding = await get_holding(user_id, symbol)
-        if holding:
-            shares, avg = holding
-            total = shares + shares_possible
-            new_avg = ((shares * avg) + (shares_possible * price)) / total
-            await update_holding(user_id, symbol, total, new_avg)
-        else:
-            await insert_holding(user_id, symbol, shares_possible, price)
-        await update_cash(user_id, cash - actual_cost)
         await ctx.send(
             f"✅ {ctx.author.mention} bought **{shares_possible} shares** of `{symbol}` ({company_name}) with ${actual_cost:,.2f}"
         )
@@ -0,0 +1,84 @@
+"""
+Discord user lookup shared by the command cogs.
+
+Leaderboards and daily updates need a display name for every user they
+list. Discord's in-memory caches answer most lookups for free; anything
+they miss costs a REST call, so those results are memoized here.
+
+Environment Variables:
+- USER_CACHE_TTL: Seconds a fetched user is reused (default: 3600)
+- MAX_USER_CACHE_SIZE: Maximum memoized users (default: 1000)
+- MAX_CONCURRENT_USER_FETCHES: Concurrent fetch_user REST calls (default: 10)
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Union
+
+import discord
+from discord.ext import commands
+
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "3600"))
+MAX_USER_CACHE_SIZE = int(os.getenv("MAX_USER_CACHE_SIZE", "1000"))
+MAX_CONCURRENT_USER_FETCHES = int(os.getenv("MAX_CONCURRENT_USER_FETCHES", "10"))
+
+# Users returned by fetch_user, in least- to most-recently-used order
+_fetched_users: "OrderedDict[int, tuple[discord.User, float]]" = OrderedDict()
+
+# Bounds the REST calls a large resolve_users batch has in flight at once
+_fetch_semaphore = asyncio.Semaphore(MAX_CONCURRENT_USER_FETCHES)
+
+
+async def resolve_user(
+    bot: commands.Bot, user_id: int, guild: Optional[discord.Guild] = None
+) -> Union[discord.Member, discord.User]:
+    """
+    Return a Discord user, preferring cached objects over a REST call.
+
+    Args:
+        bot: The Discord bot instance
+        user_id: Discord user ID
+        guild: Guild whose cached members are checked first
+
+    Raises:
+        discord.NotFound: If the user no longer exists
+    """
+    user = (guild.get_member(user_id) if guild else None) or bot.get_user(user_id)
+    if user is not None:
+        return user
+
+    now = time.time()
+    cached = _fetched_users.get(user_id)
+    if cached and now - cached[1] < USER_CACHE_TTL:
+        _fetched_users.move_to_end(user_id)
+        return cached[0]
+
+    async with _fetch_semaphore:
+        user = await bot.fetch_user(user_id)
+    _fetched_users[user_id] = (user, now)
+    _fetched_users.move_to_end(user_id)
+    while len(_fetched_users) > MAX_USER_CACHE_SIZE:
+        _fetched_users.popitem(last=False)
+    return user
+
+
+async def resolve_users(
+    bot: commands.Bot, user_ids: Iterable[int], guild: Optional[discord.Guild] = None
+) -> dict[int, Optional[Union[discord.Member, discord.User]]]:
+    """
+    Resolve many users at once, running any REST lookups concurrently
+    (at most MAX_CONCURRENT_USER_FETCHES at a time).
+    
+    Users that can't be resolved (deleted accounts, HTTP errors) map to None
+    instead of failing the whole batch.
+    """
+    unique = list(dict.fromkeys(user_ids))
+    results = await asyncio.gather(
+        *(resolve_user(bot, user_id, guild) for user_id in unique), return_exceptions=True
+    )
+    return {
+        user_id: None if isinstance(user, BaseException) else user
+        for user_id, user in zip(unique, results)
+    }
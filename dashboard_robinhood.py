@@ -34,7 +34,11 @@ Environment Variables:
 - DATABASE_URL: Path to SQLite database file
 - PORT: Web server port (default: 8080, Fly.io compatible)
 - PRICE_CACHE_TTL: Price cache duration in seconds
+- MAX_PRICE_CACHE_SIZE: Maximum cached prices (default: 1000)
+- MAX_COMPANY_CACHE_SIZE: Maximum cached company names (default: 500)
 - DASHBOARD_CACHE_DURATION: Dashboard data cache duration
+- LOG_LEVEL: Dashboard log verbosity (default: WARNING)
+- DASHBOARD_FETCH_WORKERS: Concurrent price/company lookups per portfolio page (default: 8)
 
 Deployment:
 - Optimized for Fly.io free tier deployment
@@ -46,13 +50,17 @@ Deployment:
 from flask import Flask, render_template, url_for, redirect, jsonify
 import sqlite3
 import requests
-from datetime import datetime, date
 import os
 import time
 import atexit
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional, Any
 from dotenv import load_dotenv
 
+from database import SQLITE_PRAGMAS, UPSERT_LAST_PRICE_AT, SEL_PRICE_CACHE
+
 # Load environment variables
 load_dotenv()
 
@@ -66,35 +74,73 @@ DB_NAME = os.getenv("DATABASE_URL", "/data/trading_game.db")
 APP_NAME = "Trading Dashboard"
 
 app = Flask(__name__, template_folder="templates")
+# Per-symbol cache/fallback messages are DEBUG; raise verbosity with LOG_LEVEL=DEBUG
+app.logger.setLevel(os.getenv("LOG_LEVEL", "WARNING").upper())
 
 # Module-level price cache with timestamps (shared with bot)
-price_cache = {}
+# Both caches are bounded LRUs kept in least- to most-recently-used order
+price_cache: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+MAX_CACHE_SIZE = int(os.getenv("MAX_PRICE_CACHE_SIZE", "1000"))
 # Cache time-to-live in seconds (override with PRICE_CACHE_TTL env var)
 CACHE_DURATION = int(os.getenv("PRICE_CACHE_TTL", "86400"))
 CACHE_TTL = CACHE_DURATION  # keep in sync with bot
 rate_limit_until = 0  # timestamp until we should avoid API calls
-last_request_time = 0  # throttle API requests
-# Minimum seconds between API calls (shared with bot)
+# Minimum seconds between API calls for the same symbol (shared with bot)
 MIN_REQUEST_INTERVAL = float(os.getenv("MIN_REQUEST_INTERVAL", 2))
-company_name_cache = {}
+# When each symbol last went to the API; per symbol so the parallel lookups
+# of one portfolio page aren't cut off after the first request
+_last_fetch_at: "OrderedDict[str, float]" = OrderedDict()
+company_name_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
 COMPANY_CACHE_TTL = int(os.getenv("COMPANY_CACHE_TTL", 86400))
+MAX_COMPANY_CACHE_SIZE = int(os.getenv("MAX_COMPANY_CACHE_SIZE", "500"))
+# Request threads and the lookup pool share the caches
+_cache_lock = threading.Lock()
 
 # Cached leaderboard data to minimize API usage
 dashboard_data = {"leaderboard": None, "summary": None, "timestamp": 0}
 DASHBOARD_CACHE_DURATION = int(os.getenv("DASHBOARD_CACHE_DURATION", 300))
 
+# Portfolio pages look up every holding's price and company name; these
+# blocking HTTP calls run on a small shared pool so their latency overlaps
+DASHBOARD_FETCH_WORKERS = int(os.getenv("DASHBOARD_FETCH_WORKERS", 8))
+_fetch_executor = ThreadPoolExecutor(
+    max_workers=DASHBOARD_FETCH_WORKERS, thread_name_prefix="dashboard-fetch"
+)
+
+# One SQLite connection per worker thread, reused across requests
+_local = threading.local()
+
+def open_db(**kwargs: Any) -> sqlite3.Connection:
+    """Open a SQLite connection with the bot's WAL/mmap/busy_timeout tuning applied."""
+    conn = sqlite3.connect(DB_NAME, **kwargs)
+    # Same tuning as the bot so dashboard reads don't block on the bot's writes
+    conn.executescript(SQLITE_PRAGMAS)
+    return conn
+
+def get_db() -> sqlite3.Connection:
+    """Return this thread's SQLite connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = open_db()
+        _local.conn = conn
+    return conn
+
 def flush_price_cache() -> None:
     """Persist in-memory price cache to the database."""
+    with _cache_lock:
+        snapshot = list(price_cache.items())
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        for symbol, (price, _) in price_cache.items():
-            cursor.execute(
-                "INSERT OR REPLACE INTO last_price (symbol, price, last_updated) VALUES (?, ?, CURRENT_TIMESTAMP)",
-                (symbol.upper(), price),
+        conn = open_db(isolation_level=None)
+        try:
+            # One explicit transaction and one bulk statement for the whole cache
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                UPSERT_LAST_PRICE_AT,
+                [(symbol.upper(), price, ts) for symbol, (price, ts) in snapshot],
             )
-        conn.commit()
-        conn.close()
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
         print("📝 Price cache flushed to database")
     except Exception:
         pass
@@ -104,36 +150,57 @@ atexit.register(flush_price_cache)
 # ──────────────────────────────────────────────────────────────
 # Helper Functions
 # ──────────────────────────────────────────────────────────────
+def _cache_get(cache: OrderedDict, key: str) -> Optional[Tuple[Any, float]]:
+    """Return a cache entry and mark it most recently used."""
+    with _cache_lock:
+        entry = cache.get(key)
+        if entry is not None:
+            cache.move_to_end(key)
+        return entry
+
+def _cache_put(cache: OrderedDict, max_size: int, key: str, value: Tuple[Any, float]) -> None:
+    """Insert an entry, evicting least recently used entries beyond max_size."""
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+def _throttled(symbol: str) -> bool:
+    """Return True if the symbol was requested within MIN_REQUEST_INTERVAL, else record this request."""
+    now = time.time()
+    with _cache_lock:
+        last = _last_fetch_at.get(symbol)
+        if last is not None and now - last < MIN_REQUEST_INTERVAL:
+            return True
+        _last_fetch_at[symbol] = now
+        _last_fetch_at.move_to_end(symbol)
+        while len(_last_fetch_at) > MAX_CACHE_SIZE:
+            _last_fetch_at.popitem(last=False)
+    return False
+
 def preload_price_cache():
     """Load cached prices from the database into memory."""
     global price_cache
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
     
     try:
-        cursor.execute("SELECT symbol, price, last_updated FROM last_price")
+        # Same query as the bot: SQLite turns its UTC timestamps into epoch
+        # seconds, skipping rows it can't parse
+        cursor.execute(SEL_PRICE_CACHE)
         rows = cursor.fetchall()
         
-        for symbol, price, last_updated in rows:
-            # Convert SQLite timestamp to Unix timestamp
-            try:
-                # Parse the CURRENT_TIMESTAMP format from SQLite
-                dt = datetime.fromisoformat(last_updated.replace('Z', '+00:00'))
-                timestamp = dt.timestamp()
-                price_cache[symbol.upper()] = (price, timestamp)
-                print(f"Preloaded cached price for {symbol}: ${price:.2f}")
-            except Exception as e:
-                print(f"Error parsing timestamp for {symbol}: {e}")
+        for symbol, price, timestamp in rows:
+            _cache_put(price_cache, MAX_CACHE_SIZE, symbol.upper(), (price, timestamp))
+            app.logger.debug("Preloaded cached price for %s: $%.2f", symbol, price)
+        print(f"📈 Preloaded {len(price_cache)} cached prices")
     except sqlite3.OperationalError:
         # Table doesn't exist yet, that's okay
         print("last_price table doesn't exist yet, skipping price cache preload")
-    finally:
-        conn.close()
 
 def get_last_price_from_db(symbol: str) -> float | None:
     """Get last known price for symbol from database."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
     
     try:
         cursor.execute("SELECT price FROM last_price WHERE symbol = ?", (symbol.upper(),))
@@ -143,28 +210,37 @@ def get_last_price_from_db(symbol: str) -> float | None:
     except sqlite3.OperationalError:
         # Table doesn't exist yet
         pass
-    finally:
-        conn.close()
     return None
 
+def get_last_prices_from_db(symbols: List[str]) -> Dict[str, float]:
+    """Get last known prices for many symbols from the database in one query."""
+    if not symbols:
+        return {}
+    placeholders = ",".join("?" * len(symbols))
+    try:
+        rows = get_db().execute(
+            f"SELECT symbol, price FROM last_price WHERE symbol IN ({placeholders})",
+            [symbol.upper() for symbol in symbols],
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # Table doesn't exist yet
+        return {}
+    return dict(rows)
+
 def save_price_to_db(symbol: str, price: float) -> None:
     """Persist latest price to the database."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
+    conn = get_db()
+    conn.execute(
         "INSERT OR REPLACE INTO last_price (symbol, price, last_updated) VALUES (?, ?, CURRENT_TIMESTAMP)",
         (symbol.upper(), price),
     )
     conn.commit()
-    conn.close()
 
 def get_price_yahoo(symbol: str) -> float | None:
     """Fetch price from Yahoo Finance as a fallback."""
     url = f"https://query1.finance.yahoo.com/v7/finance/quote?symbols={symbol}"
-    global last_request_time
     try:
         resp = requests.get(url, timeout=5)
-        last_request_time = time.time()
         if resp.status_code == 200:
             data = resp.json()
             result = data.get("quoteResponse", {}).get("result", [])
@@ -173,25 +249,27 @@ def get_price_yahoo(symbol: str) -> float | None:
                 if price and price > 0:
                     return price
     except Exception as exc:
-        print(f"Yahoo Finance error for {symbol}: {exc}")
+        app.logger.warning("Yahoo Finance error for %s: %s", symbol, exc)
     return None
 
 def get_price(symbol: str) -> float | None:
     """Get stock price with caching and rate limit handling."""
-    global rate_limit_until, last_request_time
+    global rate_limit_until
     cache_key = symbol.upper()
     current_time = time.time()
     
     # Check if we have a cached price that's still fresh
-    if cache_key in price_cache:
-        cached_price, cached_time = price_cache[cache_key]
+    cached = _cache_get(price_cache, cache_key)
+    if cached:
+        cached_price, cached_time = cached
         if current_time - cached_time < CACHE_DURATION:
             return cached_price
     
     # Throttle requests to avoid excessive API usage
-    if current_time - last_request_time < MIN_REQUEST_INTERVAL:
-        if cache_key in price_cache:
-            cached_price, _ = price_cache[cache_key]
+    if _throttled(cache_key):
+        cached = _cache_get(price_cache, cache_key)
+        if cached:
+            cached_price, _ = cached
             return cached_price
         db_price = get_last_price_from_db(symbol)
         if db_price:
@@ -201,9 +279,10 @@ def get_price(symbol: str) -> float | None:
     # Check if we're in a rate limit period
     if current_time < rate_limit_until:
         # Return cached price if available during rate limit
-        if cache_key in price_cache:
-            cached_price, _ = price_cache[cache_key]
-            print(f"Rate limited, using cached price for {symbol}: ${cached_price:.2f}")
+        cached = _cache_get(price_cache, cache_key)
+        if cached:
+            cached_price, _ = cached
+            app.logger.debug("Rate limited, using cached price for %s: $%.2f", symbol, cached_price)
             return cached_price
         return None
     
@@ -213,48 +292,46 @@ def get_price(symbol: str) -> float | None:
     
     try:
         response = requests.get(url, timeout=5)
-        last_request_time = time.time()
         
         if response.status_code == 429:
             # Rate limited - set rate limit period and try secondary key
             rate_limit_until = current_time + 60
-            print(f"Rate limited on primary key, trying secondary key for {symbol}")
+            app.logger.info("Rate limited on primary key, trying secondary key for %s", symbol)
             
             if FINNHUB_API_KEY_SECOND:
                 url_secondary = f"https://finnhub.io/api/v1/quote?symbol={symbol}&token={FINNHUB_API_KEY_SECOND}"
                 response_secondary = requests.get(url_secondary, timeout=5)
-                last_request_time = time.time()
 
                 if response_secondary.status_code == 200:
                     data = response_secondary.json()
                     price = data.get("c")
                     if price and price > 0:
                         # Cache the result
-                        price_cache[cache_key] = (price, current_time)
+                        _cache_put(price_cache, MAX_CACHE_SIZE, cache_key, (price, current_time))
                         save_price_to_db(symbol, price)
                         return price
                 elif response_secondary.status_code == 429:
-                    print(f"Secondary key also rate limited for {symbol}")
+                    app.logger.info("Secondary key also rate limited for %s", symbol)
             
             # Try alternative key if available
             if FINNHUB_API_KEY_2:
                 url_alt = f"https://finnhub.io/api/v1/quote?symbol={symbol}&token={FINNHUB_API_KEY_2}"
                 response_alt = requests.get(url_alt, timeout=5)
-                last_request_time = time.time()
 
                 if response_alt.status_code == 200:
                     data = response_alt.json()
                     price = data.get("c")
                     if price and price > 0:
                         # Cache the result
-                        price_cache[cache_key] = (price, current_time)
+                        _cache_put(price_cache, MAX_CACHE_SIZE, cache_key, (price, current_time))
                         save_price_to_db(symbol, price)
                         return price
             
             # If both keys are rate limited, return cached price if available
-            if cache_key in price_cache:
-                cached_price, _ = price_cache[cache_key]
-                print(f"Both keys rate limited, using cached price for {symbol}: ${cached_price:.2f}")
+            cached = _cache_get(price_cache, cache_key)
+            if cached:
+                cached_price, _ = cached
+                app.logger.debug("Both keys rate limited, using cached price for %s: $%.2f", symbol, cached_price)
                 return cached_price
             return None
         
@@ -263,40 +340,42 @@ def get_price(symbol: str) -> float | None:
             price = data.get("c")
             if price and price > 0:
                 # Cache the result
-                price_cache[cache_key] = (price, current_time)
+                _cache_put(price_cache, MAX_CACHE_SIZE, cache_key, (price, current_time))
                 save_price_to_db(symbol, price)
                 return price
         
         # API call failed, attempt Yahoo Finance fallback
         yahoo_price = get_price_yahoo(symbol)
         if yahoo_price:
-            price_cache[cache_key] = (yahoo_price, current_time)
+            _cache_put(price_cache, MAX_CACHE_SIZE, cache_key, (yahoo_price, current_time))
             save_price_to_db(symbol, yahoo_price)
             return yahoo_price
 
         # Use cached price if available
-        if cache_key in price_cache:
-            cached_price, _ = price_cache[cache_key]
-            print(f"API call failed, using cached price for {symbol}: ${cached_price:.2f}")
+        cached = _cache_get(price_cache, cache_key)
+        if cached:
+            cached_price, _ = cached
+            app.logger.debug("API call failed, using cached price for %s: $%.2f", symbol, cached_price)
             return cached_price
         return None
         
     except Exception as e:
-        print(f"Error fetching price for {symbol}: {e}")
+        app.logger.warning("Error fetching price for %s: %s", symbol, e)
 
         yahoo_price = get_price_yahoo(symbol)
         if yahoo_price:
-            price_cache[cache_key] = (yahoo_price, current_time)
+            _cache_put(price_cache, MAX_CACHE_SIZE, cache_key, (yahoo_price, current_time))
             save_price_to_db(symbol, yahoo_price)
             return yahoo_price
 
-        if cache_key in price_cache:
-            cached_price, _ = price_cache[cache_key]
+        cached = _cache_get(price_cache, cache_key)
+        if cached:
+            cached_price, _ = cached
             return cached_price
 
         db_price = get_last_price_from_db(symbol)
         if db_price:
-            print(f"Using database fallback price for {symbol}: ${db_price:.2f}")
+            app.logger.debug("Using database fallback price for %s: $%.2f", symbol, db_price)
             return db_price
 
         return None
@@ -306,26 +385,26 @@ def get_company_name(symbol: str) -> str | None:
     key = symbol.upper()
     current_time = time.time()
 
-    if key in company_name_cache:
-        name, ts = company_name_cache[key]
+    cached = _cache_get(company_name_cache, key)
+    if cached:
+        name, ts = cached
         if current_time - ts < COMPANY_CACHE_TTL:
             return name
 
     url = f"https://finnhub.io/api/v1/stock/profile2?symbol={key}&token={FINNHUB_API_KEY}"
-    global last_request_time
     try:
         response = requests.get(url, timeout=5)
-        last_request_time = time.time()
         if response.status_code == 200:
             data = response.json()
             name = data.get("name", key)
-            company_name_cache[key] = (name, current_time)
+            _cache_put(company_name_cache, MAX_COMPANY_CACHE_SIZE, key, (name, current_time))
             return name
     except Exception as e:
-        print(f"Error fetching company name for {symbol}: {e}")
+        app.logger.warning("Error fetching company name for %s: %s", symbol, e)
 
-    if key in company_name_cache:
-        return company_name_cache[key][0]
+    cached = _cache_get(company_name_cache, key)
+    if cached:
+        return cached[0]
     return None
 
 def fetch_leaderboard():
@@ -336,11 +415,21 @@ def fetch_leaderboard():
     to avoid API rate limits. Fresh prices are only fetched when viewing individual
     user portfolio pages via fetch_user_portfolio().
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
     
-    # Get all users
-    cursor.execute("SELECT user_id, cash, initial_value, username FROM users")
+    # One query values every user: holdings are priced from last_price, falling
+    # back to average cost when no cached price is available (no API calls)
+    cursor.execute(
+        """
+        SELECT u.user_id, u.cash, u.initial_value, u.username,
+               COUNT(h.symbol),
+               COALESCE(SUM(h.shares * COALESCE(NULLIF(lp.price, 0), h.avg_price)), 0)
+        FROM users u
+        LEFT JOIN holdings h ON h.user_id = u.user_id
+        LEFT JOIN last_price lp ON lp.symbol = UPPER(h.symbol)
+        GROUP BY u.user_id
+        """
+    )
     users = cursor.fetchall()
     
     leaderboard = []
@@ -348,31 +437,16 @@ def fetch_leaderboard():
     total_roi = 0
     valid_users = 0
     
-    for user_id, cash, initial_value, username in users:
-        name = username if username else f"User-{user_id[-4:]}"
-        # Get holdings
-        cursor.execute("SELECT symbol, shares, avg_price FROM holdings WHERE user_id = ?", (user_id,))
-        holdings = cursor.fetchall()
-        
-        # Calculate portfolio value using ONLY cached/database prices for performance
-        holdings_value = 0
-        total_holdings = len(holdings)
-        for symbol, shares, avg_price in holdings:
-            # Use database price only - no fresh API calls for leaderboard
-            db_price = get_last_price_from_db(symbol)
-            if db_price:
-                holdings_value += db_price * shares
-            else:
-                # If no cached price available, use average cost as fallback
-                # This prevents API calls but gives approximate values
-                holdings_value += avg_price * shares
+    for user_id, cash, initial_value, username, total_holdings, holdings_value in users:
+        name = username if username else f"User-{str(user_id)[-4:]}"
         
         total_value = cash + holdings_value
         roi = ((total_value - initial_value) / initial_value) * 100 if initial_value else 0
         pnl = total_value - initial_value
         
         leaderboard.append({
-            "user_id": user_id,
+            # Snowflakes exceed 2**53, so JSON clients need them as strings
+            "user_id": str(user_id),
             "name": name,
             "cash": cash,
             "holdings_value": holdings_value,
@@ -401,42 +475,47 @@ def fetch_leaderboard():
         "best_performer": best_performer
     }
     
-    conn.close()
     return leaderboard, summary
 
 def fetch_user_portfolio(user_id: str):
     """Return detailed portfolio data for a specific user."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
     
     # Get user data
     cursor.execute("SELECT username, cash, initial_value FROM users WHERE user_id = ?", (user_id,))
     user_row = cursor.fetchone()
     
     if not user_row:
-        conn.close()
         return None
     
     username, cash, initial_value = user_row
-    name = username if username else f"User-{user_id[-4:]}"
+    name = username if username else f"User-{str(user_id)[-4:]}"
     
     # Get holdings
     cursor.execute("SELECT symbol, shares, avg_price FROM holdings WHERE user_id = ?", (user_id,))
     holdings_rows = cursor.fetchall()
     
+    # Submit every lookup up front so total wait is the slowest call, not the sum
+    symbols = [row[0] for row in holdings_rows]
+    price_results = _fetch_executor.map(get_price, symbols)
+    company_names = _fetch_executor.map(get_company_name, symbols)
+    prices = list(price_results)
+    
+    # One query covers the database fallback for every unpriced holding
+    db_prices = get_last_prices_from_db([s for s, p in zip(symbols, prices) if not p])
+    
     holdings = []
     holdings_value = 0
-    for symbol, shares, avg_price in holdings_rows:
-        price = get_price(symbol)
+    for (symbol, shares, avg_price), price, company_name in zip(holdings_rows, prices, company_names):
         if not price:
             # Try database fallback for last known price
-            db_price = get_last_price_from_db(symbol)
+            db_price = db_prices.get(symbol.upper())
             if db_price:
-                print(f"Using database fallback for {symbol} in user portfolio: ${db_price:.2f}")
+                app.logger.debug("Using database fallback for %s in user portfolio: $%.2f", symbol, db_price)
                 price = db_price
             else:
                 # Skip positions where we can't get any price to avoid incorrect P&L
-                print(f"Warning: Could not fetch price for {symbol}, skipping from portfolio calculation")
+                app.logger.warning("Could not fetch price for %s, skipping from portfolio calculation", symbol)
                 continue
             
         value = price * shares
@@ -444,9 +523,6 @@ def fetch_user_portfolio(user_id: str):
         unrealized_pnl = (price - avg_price) * shares
         holdings_value += value
         
-        # Get company name
-        company_name = get_company_name(symbol)
-        
         holdings.append({
             "symbol": symbol,
             "company_name": company_name or symbol,
@@ -484,8 +560,6 @@ def fetch_user_portfolio(user_id: str):
     
     roi = ((total_value - initial_value) / initial_value) * 100 if initial_value else 0
     
-    conn.close()
-    
     return {
         "name": name,
         "cash": cash,
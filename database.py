@@ -7,15 +7,18 @@ It uses SQLite with aiosqlite for async operations and is optimized for minimal
 memory usage on Fly.io free tier deployments.
 
 Database Schema:
-- users: Discord user accounts with cash balances and portfolio tracking
+- users: Discord user accounts (INTEGER snowflake ids) with cash balances and portfolio tracking
 - holdings: Stock positions with shares and average cost basis
 - history: Daily portfolio value snapshots for performance charts
 - last_price: Cached stock prices with timestamps for API efficiency
+- company_name: Cached company names so lookups survive restarts
 
 Key Features:
 - Async/await operations for non-blocking database access
 - Automatic schema creation and migration
 - Memory-optimized connection settings
+- Single shared connection with serialized write transactions, plus a
+  read-only connection for lookups
 - Type-safe operations with proper error handling
 - Configurable starting capital via environment variables
 
@@ -25,9 +28,11 @@ Environment Variables:
 """
 
 import os
+import asyncio
 import aiosqlite
+from contextlib import asynccontextmanager
 from datetime import date
-from typing import Optional, List, Tuple, Any
+from typing import Optional, List, Tuple, Any, AsyncIterator, Sequence
 
 # Database configuration
 DB_NAME = os.getenv("DATABASE_URL", "/data/trading_game.db")
@@ -37,231 +42,543 @@ DEFAULT_STARTING_CASH = int(os.getenv("DEFAULT_STARTING_CASH", "1000000"))
 SQLITE_SETTINGS = {
     "isolation_level": None,  # Autocommit mode for better performance
     "check_same_thread": False,  # Allow multi-threaded access
+    "cached_statements": 256,  # Keep prepared statements for every hot query
 }
 
+# Performance PRAGMAs: WAL lets readers run alongside writes and
+# synchronous=NORMAL drops the per-commit fsync (safe under WAL)
+SQLITE_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA mmap_size=268435456;
+PRAGMA cache_size=-65536;
+PRAGMA busy_timeout=5000;
+"""
+
+# The read connection opens the database read-only and only needs the
+# per-connection cache/mmap tuning; query_only guards against stray writes
+SQLITE_READ_PRAGMAS = """
+PRAGMA query_only=1;
+PRAGMA temp_store=MEMORY;
+PRAGMA mmap_size=268435456;
+PRAGMA cache_size=-65536;
+PRAGMA busy_timeout=5000;
+"""
+
+# Hot-path SQL kept as constants so the shared connection's statement
+# cache reuses the prepared statement instead of re-parsing each call
+SEL_USER = "SELECT * FROM users WHERE user_id = ?"
+INS_USER = "INSERT OR IGNORE INTO users (user_id, cash, username) VALUES (?, ?, ?)"
+SEL_USER_CASH = "SELECT cash FROM users WHERE user_id = ?"
+SEL_HOLDINGS = "SELECT symbol, shares, avg_price FROM holdings WHERE user_id = ?"
+SEL_HOLDING = "SELECT shares, avg_price FROM holdings WHERE user_id = ? AND symbol = ?"
+DEL_HOLDING = "DELETE FROM holdings WHERE user_id = ? AND symbol = ?"
+# Adds shares to a position, folding the new lot into the weighted average price
+UPSERT_HOLDING = """
+    INSERT INTO holdings (user_id, symbol, shares, avg_price) VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id, symbol) DO UPDATE SET
+        avg_price = (holdings.shares * holdings.avg_price + excluded.shares * excluded.avg_price)
+                    / (holdings.shares + excluded.shares),
+        shares = holdings.shares + excluded.shares
+"""
+# Removes shares only when the position is large enough, returning what is left
+REDUCE_HOLDING = """
+    UPDATE holdings SET shares = shares - ?
+    WHERE user_id = ? AND symbol = ? AND shares >= ?
+    RETURNING shares
+"""
+ADD_USER_CASH = "UPDATE users SET cash = cash + ? WHERE user_id = ?"
+# Debits only when the balance covers the cost, so the funds check and the
+# write are one atomic statement
+DEBIT_USER_CASH = "UPDATE users SET cash = cash - ? WHERE user_id = ? AND cash >= ? RETURNING cash"
+UPD_LAST_VALUE = "UPDATE users SET last_value = ? WHERE user_id = ?"
+UPSERT_HISTORY = "INSERT OR REPLACE INTO history (user_id, date, portfolio_value) VALUES (?, ?, ?)"
+UPSERT_LAST_PRICE = "INSERT OR REPLACE INTO last_price (symbol, price, last_updated) VALUES (?, ?, CURRENT_TIMESTAMP)"
+# Keeps the time the price was fetched (epoch seconds) rather than the time it was saved
+UPSERT_LAST_PRICE_AT = "INSERT OR REPLACE INTO last_price (symbol, price, last_updated) VALUES (?, ?, datetime(?, 'unixepoch'))"
+SEL_LAST_PRICE = "SELECT price FROM last_price WHERE symbol = ?"
+# Batch lookups; format in one "?" placeholder per symbol
+SEL_LAST_PRICES_IN = (
+    "SELECT symbol, price, COALESCE(CAST(strftime('%s', last_updated) AS REAL), 0) "
+    "FROM last_price WHERE symbol IN ({})"
+)
+SEL_COMPANY_NAMES_IN = (
+    "SELECT symbol, name, COALESCE(CAST(strftime('%s', last_updated) AS REAL), 0) "
+    "FROM company_name WHERE symbol IN ({})"
+)
+# Cache preloads: SQLite converts its UTC CURRENT_TIMESTAMP text to epoch
+# seconds itself (NULL if unparseable). Oldest first so the most recently
+# updated entries end up most recently used.
+SEL_PRICE_CACHE = """
+    SELECT symbol, price, ts FROM (
+        SELECT symbol, price, CAST(strftime('%s', last_updated) AS REAL) AS ts
+        FROM last_price
+    )
+    WHERE ts IS NOT NULL
+    ORDER BY ts
+"""
+SEL_COMPANY_NAME_CACHE = """
+    SELECT symbol, name, ts FROM (
+        SELECT symbol, name, CAST(strftime('%s', last_updated) AS REAL) AS ts
+        FROM company_name
+    )
+    WHERE ts IS NOT NULL
+    ORDER BY ts
+"""
+UPSERT_COMPANY_NAME = "INSERT OR REPLACE INTO company_name (symbol, name, last_updated) VALUES (?, ?, CURRENT_TIMESTAMP)"
+SEL_HISTORY = "SELECT date, portfolio_value FROM history WHERE user_id = ? ORDER BY date"
+SEL_PORTFOLIO = """
+    SELECT u.cash, u.initial_value, h.symbol, h.shares, h.avg_price
+    FROM users u
+    LEFT JOIN holdings h ON h.user_id = u.user_id
+    WHERE u.user_id = ?
+"""
+SEL_ALL_PORTFOLIOS = """
+    SELECT u.user_id, u.cash, u.initial_value, u.last_value, h.symbol, h.shares
+    FROM users u
+    LEFT JOIN holdings h ON h.user_id = u.user_id
+"""
+# Market-wide aggregates for !stats: SQLite sums every account and every
+# symbol's share count, so only one row per held symbol leaves the database
+SEL_USER_TOTALS = "SELECT COUNT(*), COALESCE(SUM(cash), 0), COALESCE(SUM(initial_value), 0) FROM users"
+SEL_SHARES_BY_SYMBOL = """
+    SELECT h.symbol, SUM(h.shares)
+    FROM holdings h
+    JOIN users u ON u.user_id = h.user_id
+    GROUP BY h.symbol
+"""
+
+# Shared connection reused by every command; writers are serialized by
+# _write_lock so explicit transactions never interleave. Read-only helpers
+# use a second connection so, under WAL, they aren't queued behind a write
+# transaction on the writer's thread or exposed to its uncommitted rows.
+_db: aiosqlite.Connection | None = None
+_read_db: aiosqlite.Connection | None = None
+_connect_lock = asyncio.Lock()
+_write_lock = asyncio.Lock()
+
+async def get_db() -> aiosqlite.Connection:
+    """Return the shared database connection, opening it on first use."""
+    global _db
+    async with _connect_lock:
+        if _db is None:
+            _db = await aiosqlite.connect(DB_NAME, **SQLITE_SETTINGS)
+            await _db.executescript(SQLITE_PRAGMAS)
+    return _db
+
+async def get_read_db() -> aiosqlite.Connection:
+    """Return the shared read-only connection, opening it on first use."""
+    global _read_db
+    if _read_db is None:
+        # The writer creates the file and switches it to WAL before any reader opens it
+        await get_db()
+        async with _connect_lock:
+            if _read_db is None:
+                _read_db = await aiosqlite.connect(
+                    f"file:{DB_NAME}?mode=ro", uri=True, **SQLITE_SETTINGS
+                )
+                await _read_db.executescript(SQLITE_READ_PRAGMAS)
+    return _read_db
+
+async def close_db() -> None:
+    """Close the shared database connections if they are open."""
+    global _db, _read_db
+    async with _connect_lock:
+        if _read_db is not None:
+            await _read_db.close()
+            _read_db = None
+        if _db is not None:
+            try:
+                # Refresh planner statistics gathered over this connection's lifetime
+                await _db.execute("PRAGMA optimize")
+            finally:
+                await _db.close()
+                _db = None
+
+@asynccontextmanager
+async def transaction() -> AsyncIterator[aiosqlite.Connection]:
+    """
+    Run a block of writes atomically on the shared connection.
+    
+    Commits when the block exits normally and rolls back on error.
+    
+    Example:
+        async with transaction() as db:
+            await db.execute(ADD_USER_CASH, (amount, user_id))
+    """
+    db = await get_db()
+    async with _write_lock:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            await db.rollback()
+            raise
+        await db.commit()
+
+# Stored in PRAGMA user_version once init_db has brought a database up to
+# date; bump it whenever TABLE_SCHEMAS or the migrations change
+SCHEMA_VERSION = 1
+
+# Column definitions for every table, shared by init_db and migrations
+TABLE_SCHEMAS = {
+    "users": f"""(
+        user_id INTEGER PRIMARY KEY,
+        cash REAL DEFAULT {DEFAULT_STARTING_CASH},
+        initial_value REAL DEFAULT {DEFAULT_STARTING_CASH},
+        last_value REAL DEFAULT {DEFAULT_STARTING_CASH},
+        username TEXT
+    )""",
+    "holdings": """(
+        user_id INTEGER,
+        symbol TEXT,
+        shares INTEGER,
+        avg_price REAL,
+        PRIMARY KEY (user_id, symbol)
+    )""",
+    # Append-only time series: WITHOUT ROWID stores rows in the PK B-tree
+    "history": """(
+        user_id INTEGER,
+        date TEXT,
+        portfolio_value REAL,
+        PRIMARY KEY (user_id, date)
+    ) WITHOUT ROWID""",
+    "last_price": """(
+        symbol TEXT PRIMARY KEY,
+        price REAL,
+        last_updated TEXT
+    )""",
+    "company_name": """(
+        symbol TEXT PRIMARY KEY,
+        name TEXT,
+        last_updated TEXT
+    )""",
+}
+
+async def _table_columns(db: aiosqlite.Connection, table: str) -> dict[str, str]:
+    """Return a mapping of column name to declared type for a table."""
+    rows = await db.execute_fetchall(f"PRAGMA table_info({table})")
+    return {row[1]: row[2].upper() for row in rows}
+
+async def _rebuild_table(db: aiosqlite.Connection, table: str, where: str = "") -> None:
+    """
+    Recreate a table from TABLE_SCHEMAS and copy its existing rows across.
+    
+    Columns present in both the old and new definitions are copied; user_id
+    values are cast to INTEGER on the way.
+    """
+    old_columns = await _table_columns(db, table)
+    await db.execute(f"CREATE TABLE {table}_new {TABLE_SCHEMAS[table]}")
+    shared = [c for c in await _table_columns(db, f"{table}_new") if c in old_columns]
+    select = ", ".join("CAST(user_id AS INTEGER)" if c == "user_id" else c for c in shared)
+    await db.execute(
+        f"INSERT INTO {table}_new ({', '.join(shared)}) SELECT {select} FROM {table} {where}"
+    )
+    await db.execute(f"DROP TABLE {table}")
+    await db.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+async def _migrate_user_ids(db: aiosqlite.Connection) -> None:
+    """Convert tables created with TEXT user_id columns to INTEGER ids."""
+    numeric_id = "user_id <> '' AND user_id NOT GLOB '*[^0-9]*'"
+    for table in ("users", "holdings", "history"):
+        columns = await _table_columns(db, table)
+        if columns.get("user_id") != "TEXT":
+            continue
+        ((skipped,),) = await db.execute_fetchall(
+            f"SELECT COUNT(*) FROM {table} WHERE NOT ({numeric_id})"
+        )
+        await _rebuild_table(db, table, f"WHERE {numeric_id}")
+        print(f"🔧 Migrated {table}.user_id to INTEGER")
+        if skipped:
+            print(f"⚠️  Dropped {skipped} {table} rows with non-numeric user_id")
+
+async def _migrate_history_without_rowid(db: aiosqlite.Connection) -> None:
+    """Rebuild a history table created before it was declared WITHOUT ROWID."""
+    ((sql,),) = await db.execute_fetchall(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'history'"
+    )
+    if "WITHOUT ROWID" not in sql.upper():
+        await _rebuild_table(db, "history")
+        print("🔧 Migrated history to a WITHOUT ROWID table")
+
 async def init_db() -> None:
     """
     Initialize the database schema by creating all required tables.
     
-    Creates four main tables:
+    Creates five main tables:
     1. users: Discord user accounts with financial data
     2. holdings: Individual stock positions 
     3. history: Daily portfolio value snapshots
     4. last_price: Cached stock price data
+    5. company_name: Cached company names for tickers
     
     This function is idempotent - it can be called multiple times safely.
-    Uses IF NOT EXISTS to avoid errors on existing databases.
+    Uses IF NOT EXISTS to avoid errors on existing databases, and migrates
+    older databases (TEXT user_id columns, rowid history table). It also
+    opens the shared connection, which applies SQLITE_PRAGMAS once, and
+    runs ANALYZE the first time so the query planner has statistics.
+    
+    Databases already stamped with the current SCHEMA_VERSION skip the DDL
+    and migration checks entirely, so restarts don't take the write lock.
     
     Raises:
         aiosqlite.Error: If database creation fails
     """
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            f"""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id TEXT PRIMARY KEY,
-                cash REAL DEFAULT {DEFAULT_STARTING_CASH},
-                initial_value REAL DEFAULT {DEFAULT_STARTING_CASH},
-                last_value REAL DEFAULT {DEFAULT_STARTING_CASH},
-                username TEXT
-            )
-            """
-        )
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS holdings (
-                user_id TEXT,
-                symbol TEXT,
-                shares INTEGER,
-                avg_price REAL,
-                PRIMARY KEY (user_id, symbol)
-            )
-            """
-        )
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS history (
-                user_id TEXT,
-                date TEXT,
-                portfolio_value REAL,
-                PRIMARY KEY (user_id, date)
-            )
-            """
-        )
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS last_price (
-                symbol TEXT PRIMARY KEY,
-                price REAL,
-                last_updated TEXT
-            )
-            """
+    db = await get_db()
+    ((version,),) = await db.execute_fetchall("PRAGMA user_version")
+    if version >= SCHEMA_VERSION:
+        return
+    
+    async with transaction() as db:
+        for table, columns in TABLE_SCHEMAS.items():
+            await db.execute(f"CREATE TABLE IF NOT EXISTS {table} {columns}")
+        await _migrate_user_ids(db)
+        await _migrate_history_without_rowid(db)
+        analyzed = await db.execute_fetchall(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
         )
-        await db.commit()
+        if not analyzed:
+            await db.execute("ANALYZE")
+        await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
-async def get_user(user_id: str) -> Optional[Tuple[Any, ...]] :
+async def get_user(user_id: int) -> Optional[Tuple[Any, ...]] :
     """
     Retrieve complete user record from the database.
     
     Args:
-        user_id: Discord user ID as string
+        user_id: Discord user ID
         
     Returns:
         Complete user tuple (user_id, cash, initial_value, last_value, username)
         or None if user doesn't exist
         
     Example:
-        user = await get_user("123456789")
+        user = await get_user(123456789)
         if user:
             user_id, cash, initial, last, username = user
     """
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)) as cur:
-            return await cur.fetchone()
+    db = await get_read_db()
+    rows = await db.execute_fetchall(SEL_USER, (user_id,))
+    return rows[0] if rows else None
 
 
-async def create_user(user_id: str, username: str) -> None:
+async def create_user(user_id: int, username: str) -> bool:
     """
     Create a new user account with default starting capital.
     
+    Uses INSERT OR IGNORE so the membership check and insert are a single
+    statement.
+    
     Args:
-        user_id: Discord user ID as string
+        user_id: Discord user ID
         username: Discord display name for the user
         
-    Raises:
-        aiosqlite.IntegrityError: If user already exists (PRIMARY KEY violation)
+    Returns:
+        True if the account was created, False if the user already exists
         
     Note:
         Sets cash and initial_value to DEFAULT_STARTING_CASH from environment
     """
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "INSERT INTO users (user_id, cash, username) VALUES (?, ?, ?)",
-            (user_id, DEFAULT_STARTING_CASH, username),
-        )
-        await db.commit()
+    async with transaction() as db:
+        cursor = await db.execute(INS_USER, (user_id, DEFAULT_STARTING_CASH, username))
+        return cursor.rowcount == 1
 
 
-async def get_cash(user_id: str) -> Optional[float]:
+async def get_cash(user_id: int) -> Optional[float]:
     """
     Get the current cash balance for a user.
     
     Args:
-        user_id: Discord user ID as string
+        user_id: Discord user ID
         
     Returns:
         Current cash balance as float, or None if user doesn't exist
         
     Example:
-        cash = await get_cash("123456789")
+        cash = await get_cash(123456789)
         if cash is not None:
             print(f"User has ${cash:,.2f} available")
     """
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute("SELECT cash FROM users WHERE user_id = ?", (user_id,)) as cur:
-            row = await cur.fetchone()
-            return row[0] if row else None
-
-async def update_cash(user_id: str, cash: float) -> None:
-    """Update a user's cash balance."""
-    if cash < 0:
-        raise ValueError(f"Cash balance cannot be negative: {cash}")
-    
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("UPDATE users SET cash = ? WHERE user_id = ?", (cash, user_id))
-        await db.commit()
+    db = await get_read_db()
+    rows = await db.execute_fetchall(SEL_USER_CASH, (user_id,))
+    return rows[0][0] if rows else None
 
-async def get_holdings(user_id: str) -> list[tuple[str, int, float]]:
+async def get_holdings(user_id: int) -> list[tuple[str, int, float]]:
     """Return all holdings for a user."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute(
-            "SELECT symbol, shares, avg_price FROM holdings WHERE user_id = ?",
-            (user_id,),
-        ) as cur:
-            rows = await cur.fetchall()
-            # Ensure shares are integers and avg_price are floats
-            return [(symbol, int(shares), float(avg_price)) for symbol, shares, avg_price in rows]
-
-async def get_holding(user_id: str, symbol: str) -> tuple[int, float] | None:
+    db = await get_read_db()
+    rows = await db.execute_fetchall(SEL_HOLDINGS, (user_id,))
+    # Ensure shares are integers and avg_price are floats
+    return [(symbol, int(shares), float(avg_price)) for symbol, shares, avg_price in rows]
+
+async def get_holding(user_id: int, symbol: str) -> tuple[int, float] | None:
     """Return a single holding for a user."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute(
-            "SELECT shares, avg_price FROM holdings WHERE user_id = ? AND symbol = ?",
-            (user_id, symbol),
-        ) as cur:
-            row = await cur.fetchone()
-            return (int(row[0]), float(row[1])) if row else None
-
-async def update_holding(user_id: str, symbol: str, shares: int, avg_price: float) -> None:
-    """Modify share count and average price for a holding."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "UPDATE holdings SET shares = ?, avg_price = ? WHERE user_id = ? AND symbol = ?",
-            (shares, avg_price, user_id, symbol),
-        )
-        await db.commit()
+    db = await get_read_db()
+    rows = await db.execute_fetchall(SEL_HOLDING, (user_id, symbol))
+    return (int(rows[0][0]), float(rows[0][1])) if rows else None
 
-async def insert_holding(user_id: str, symbol: str, shares: int, avg_price: float) -> None:
-    """Add a new holding record."""
+async def record_buy(user_id: int, symbol: str, shares: int, price: float) -> Optional[float]:
+    """
+    Debit the cost of a purchase and add the shares in one transaction.
+    
+    The balance check happens inside the debit UPDATE, so concurrent trades
+    can't overdraw the account. The holding is created or merged with a
+    single UPSERT that recomputes the weighted average price in SQL.
+    
+    Returns:
+        The remaining cash balance, or None if the user doesn't exist or
+        can't afford the purchase (nothing is written in that case)
+    """
     if shares <= 0:
         raise ValueError(f"Shares must be positive: {shares}")
-    if avg_price <= 0:
-        raise ValueError(f"Average price must be positive: {avg_price}")
+    if price <= 0:
+        raise ValueError(f"Price must be positive: {price}")
     
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "INSERT INTO holdings (user_id, symbol, shares, avg_price) VALUES (?, ?, ?, ?)",
-            (user_id, symbol, shares, avg_price),
-        )
-        await db.commit()
+    cost = shares * price
+    async with transaction() as db:
+        rows = await db.execute_fetchall(DEBIT_USER_CASH, (cost, user_id, cost))
+        if not rows:
+            return None
+        await db.execute(UPSERT_HOLDING, (user_id, symbol, shares, price))
+        return rows[0][0]
 
-async def delete_holding(user_id: str, symbol: str) -> None:
-    """Remove a holding from a user's portfolio."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "DELETE FROM holdings WHERE user_id = ? AND symbol = ?",
-            (user_id, symbol),
-        )
-        await db.commit()
+async def record_sell(user_id: int, symbol: str, shares: int, price: float) -> Optional[int]:
+    """
+    Remove shares from a holding and credit the proceeds in one transaction.
+    
+    The share-count check happens inside the UPDATE, so concurrent sells
+    can't take a position below zero; an emptied position is deleted.
+    
+    Returns:
+        The shares left in the position, or None if the user doesn't hold
+        enough shares (nothing is written in that case)
+    """
+    if shares <= 0:
+        raise ValueError(f"Shares must be positive: {shares}")
+    
+    async with transaction() as db:
+        rows = await db.execute_fetchall(REDUCE_HOLDING, (shares, user_id, symbol, shares))
+        if not rows:
+            return None
+        remaining = int(rows[0][0])
+        if remaining == 0:
+            await db.execute(DEL_HOLDING, (user_id, symbol))
+        await db.execute(ADD_USER_CASH, (shares * price, user_id))
+        return remaining
 
-async def record_history(user_id: str, value: float) -> None:
-    """Save a daily snapshot of a user's portfolio value."""
+async def record_daily_values(snapshots: Sequence[Tuple[int, float]]) -> None:
+    """
+    Store today's portfolio value for many users in one transaction.
+    
+    Updates each user's last_value and writes the matching history row, so a
+    daily update costs a single commit regardless of the number of users.
+    
+    Args:
+        snapshots: (user_id, total_value) pairs
+    """
     today = date.today().isoformat()
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "INSERT OR REPLACE INTO history (user_id, date, portfolio_value) VALUES (?, ?, ?)",
-            (user_id, today, value),
+    async with transaction() as db:
+        await db.executemany(
+            UPD_LAST_VALUE, [(value, user_id) for user_id, value in snapshots]
+        )
+        await db.executemany(
+            UPSERT_HISTORY, [(user_id, today, value) for user_id, value in snapshots]
         )
-        await db.commit()
 
-async def update_last_price(db: aiosqlite.Connection, symbol: str, price: float) -> None:
-    """Persist latest price for a ticker."""
-    await db.execute(
-        "INSERT OR REPLACE INTO last_price (symbol, price, last_updated) VALUES (?, ?, CURRENT_TIMESTAMP)",
-        (symbol.upper(), price),
-    )
+async def update_last_prices(db: aiosqlite.Connection, prices: Sequence[Tuple[str, float]]) -> None:
+    """Persist latest prices for many already upper-cased tickers with one executemany."""
+    await db.executemany(UPSERT_LAST_PRICE, prices)
+
+async def update_last_prices_at(
+    db: aiosqlite.Connection, prices: Sequence[Tuple[str, float, float]]
+) -> None:
+    """Persist (symbol, price, fetched_at) rows with one executemany, keeping each fetch time."""
+    await db.executemany(UPSERT_LAST_PRICE_AT, prices)
+
+async def update_company_names(db: aiosqlite.Connection, names: Sequence[Tuple[str, str]]) -> None:
+    """Persist (symbol, name) rows for already upper-cased tickers with one executemany."""
+    await db.executemany(UPSERT_COMPANY_NAME, names)
 
 async def get_last_price_from_db(symbol: str) -> float | None:
-    """Retrieve the last stored price for a ticker."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute(
-            "SELECT price FROM last_price WHERE symbol = ?",
-            (symbol.upper(),),
-        ) as cur:
-            row = await cur.fetchone()
-            return row[0] if row else None
-
-async def get_all_users() -> list[tuple[str, float, float, float]]:
-    """Return basic info for all users."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute("SELECT user_id, cash, initial_value, last_value FROM users") as cur:
-            return await cur.fetchall()
-
-async def get_history(user_id: str) -> list[tuple[str, float]]:
+    """Retrieve the last stored price for an already upper-cased ticker."""
+    db = await get_read_db()
+    rows = await db.execute_fetchall(SEL_LAST_PRICE, (symbol,))
+    return rows[0][0] if rows else None
+
+async def get_last_prices_from_db(symbols: Sequence[str]) -> dict[str, tuple[float, float]]:
+    """Return {symbol: (price, fetched_at)} for the stored tickers among upper-cased symbols in one query."""
+    if not symbols:
+        return {}
+    placeholders = ",".join("?" * len(symbols))
+    db = await get_read_db()
+    rows = await db.execute_fetchall(SEL_LAST_PRICES_IN.format(placeholders), symbols)
+    return {symbol: (price, ts) for symbol, price, ts in rows}
+
+async def get_company_names_from_db(symbols: Sequence[str]) -> dict[str, tuple[str, float]]:
+    """Return {symbol: (name, fetched_at)} for the stored tickers among upper-cased symbols in one query."""
+    if not symbols:
+        return {}
+    placeholders = ",".join("?" * len(symbols))
+    db = await get_read_db()
+    rows = await db.execute_fetchall(SEL_COMPANY_NAMES_IN.format(placeholders), symbols)
+    return {symbol: (name, ts) for symbol, name, ts in rows}
+
+async def get_portfolio(user_id: int) -> tuple[float, float, list[tuple[str, int, float]]] | None:
+    """
+    Return a user's cash, initial value and holdings using a single JOIN.
+    
+    Args:
+        user_id: Discord user ID
+        
+    Returns:
+        (cash, initial_value, holdings) where holdings is a list of
+        (symbol, shares, avg_price) tuples, or None if the user hasn't joined
+    """
+    db = await get_read_db()
+    rows = await db.execute_fetchall(SEL_PORTFOLIO, (user_id,))
+    if not rows:
+        return None
+    cash, initial_value = rows[0][0], rows[0][1]
+    holdings = [
+        (symbol, int(shares), float(avg_price))
+        for _, _, symbol, shares, avg_price in rows
+        if symbol is not None
+    ]
+    return cash, initial_value, holdings
+
+async def get_all_portfolios() -> list[tuple[int, float, float, float, list[tuple[str, int]]]]:
+    """
+    Return every user together with their holdings using a single JOIN.
+    
+    Returns:
+        List of (user_id, cash, initial_value, last_value, holdings) tuples,
+        where holdings is a list of (symbol, shares) pairs
+    """
+    db = await get_read_db()
+    rows = await db.execute_fetchall(SEL_ALL_PORTFOLIOS)
+
+    portfolios: dict[int, tuple[int, float, float, float, list[tuple[str, int]]]] = {}
+    for user_id, cash, initial_value, last_value, symbol, shares in rows:
+        if user_id not in portfolios:
+            portfolios[user_id] = (user_id, cash, initial_value, last_value, [])
+        if symbol is not None:
+            portfolios[user_id][4].append((symbol, int(shares)))
+    return list(portfolios.values())
+
+async def get_market_totals() -> tuple[int, float, float, list[tuple[str, int]]]:
+    """
+    Return market-wide totals aggregated in SQL.
+    
+    Returns:
+        (user_count, total_cash, total_initial_value, shares_by_symbol) where
+        shares_by_symbol lists (symbol, total shares held across all users)
+    """
+    db = await get_read_db()
+    ((count, cash, initial_value),) = await db.execute_fetchall(SEL_USER_TOTALS)
+    rows = await db.execute_fetchall(SEL_SHARES_BY_SYMBOL)
+    return count, cash, initial_value, [(symbol, int(shares)) for symbol, shares in rows]
+
+async def get_history(user_id: int) -> list[tuple[str, float]]:
     """Return the historical portfolio value for a user."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute(
-            "SELECT date, portfolio_value FROM history WHERE user_id = ? ORDER BY date",
-            (user_id,),
-        ) as cur:
-            return await cur.fetchall()
+    db = await get_read_db()
+    return list(await db.execute_fetchall(SEL_HISTORY, (user_id,)))
@@ -6,22 +6,19 @@ Fixes the missing last_price column in holdings table.
 
 import asyncio
 import sqlite3
-import aiosqlite
-from database import DB_NAME
+from database import get_db, transaction, close_db
 
 async def check_schema() -> dict[str, list[str]]:
     """Check current database schema and return table structures."""
     schema_info = {}
     
-    async with aiosqlite.connect(DB_NAME) as db:
-        # Get all tables
-        async with db.execute("SELECT name FROM sqlite_master WHERE type='table'") as cur:
-            tables = await cur.fetchall()
-        
-        for (table_name,) in tables:
-            async with db.execute(f"PRAGMA table_info({table_name})") as cur:
-                columns = await cur.fetchall()
-                schema_info[table_name] = [col[1] for col in columns]  # Column names
+    db = await get_db()
+    # Get all tables
+    tables = await db.execute_fetchall("SELECT name FROM sqlite_master WHERE type='table'")
+    
+    for (table_name,) in tables:
+        columns = await db.execute_fetchall(f"PRAGMA table_info({table_name})")
+        schema_info[table_name] = [col[1] for col in columns]  # Column names
     
     return schema_info
 
@@ -33,19 +30,19 @@ async def fix_holdings_schema() -> None:
     if "last_price" not in holdings_columns:
         print("⚠️  Missing 'last_price' column in holdings table. Adding it...")
         
-        async with aiosqlite.connect(DB_NAME) as db:
+        async with transaction() as db:
             await db.execute("ALTER TABLE holdings ADD COLUMN last_price REAL")
-            await db.commit()
             print("✅ Added 'last_price' column to holdings table")
     else:
         print("✅ Holdings table schema is correct")
 
 async def validate_data_integrity() -> None:
     """Validate data types and consistency."""
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with transaction() as db:
         # Check for any invalid data types in shares column
-        async with db.execute("SELECT user_id, symbol, shares FROM holdings WHERE CAST(shares AS INTEGER) != shares") as cur:
-            invalid_shares = await cur.fetchall()
+        invalid_shares = await db.execute_fetchall(
+            "SELECT user_id, symbol, shares FROM holdings WHERE CAST(shares AS INTEGER) != shares"
+        )
         
         if invalid_shares:
             print(f"⚠️  Found {len(invalid_shares)} holdings with non-integer shares:")
@@ -56,7 +53,6 @@ async def validate_data_integrity() -> None:
                     "UPDATE holdings SET shares = ROUND(shares) WHERE user_id = ? AND symbol = ?", 
                     (user_id, symbol)
                 )
-            await db.commit()
             print("✅ Fixed non-integer share values")
         else:
             print("✅ All shares data is valid")
@@ -82,5 +78,12 @@ async def main() -> None:
     
     print("\n✅ Database migration completed successfully!")
 
+async def run() -> None:
+    """Run the migration and close the shared database connection."""
+    try:
+        await main()
+    finally:
+        await close_db()
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run())
@@ -34,17 +34,45 @@ Environment Variables:
 - ALPACA_API_KEY, ALPACA_SECRET_KEY: Alpaca API credentials
 - PRICE_CACHE_TTL: Cache expiration time in seconds (default: 86400)
 - MAX_PRICE_CACHE_SIZE: Maximum cached prices (default: 1000)
-- MIN_REQUEST_INTERVAL: Minimum seconds between API calls (default: 2)
+- MIN_REQUEST_INTERVAL: Minimum seconds before a stale price is refreshed in the background
+  again after the symbol was last requested from a provider (default: 2)
+- MAX_CONCURRENT_REQUESTS: Provider requests allowed in flight at once (default: 20)
+- MAX_CONCURRENT_FINNHUB: Finnhub requests allowed in flight at once (default: 4)
+- PRICE_WRITE_DELAY: Seconds fetched prices and company names are batched before being
+  written (default: 1)
+- STALE_PRICE_TTL: Extra seconds past PRICE_CACHE_TTL that display lookups may serve
+  a cached price while it is refreshed in the background (default: 604800)
+- REVALIDATE_TIMEOUT: Seconds a background refresh of a stale price waits on its
+  single provider call before keeping the cached value (default: 2)
+- PROVIDER_TIMEOUT: Total seconds allowed for one market data request (default: 3)
+- PROVIDER_CONNECT_TIMEOUT: Seconds allowed to connect to a provider (default: 1)
+- NEGATIVE_CACHE_TTL: Seconds a symbol no provider could price is answered as
+  unknown without asking the providers again (default: 300)
+- PROVIDER_HEDGE_DELAY: Seconds a price provider may go unanswered before the next
+  fallback provider is started alongside it (default: 1)
 """
 
 import os
 import time
+import asyncio
+from collections import OrderedDict
 import aiohttp
-import aiosqlite
-from datetime import datetime
-from typing import Optional, Dict, Tuple, Any
+import numpy as np
+import orjson
+from typing import Optional, Dict, Tuple, Any, Iterable, Sequence
 
-from database import DB_NAME, get_last_price_from_db, update_last_price
+from database import (
+    get_read_db,
+    transaction,
+    get_last_price_from_db,
+    get_last_prices_from_db,
+    get_company_names_from_db,
+    update_last_prices,
+    update_last_prices_at,
+    update_company_names,
+    SEL_PRICE_CACHE,
+    SEL_COMPANY_NAME_CACHE,
+)
 
 # Load API keys
 FINNHUB_API_KEY = os.getenv("FINNHUB_API_KEY")
@@ -53,54 +81,202 @@ ALPACA_API_KEY = os.getenv("ALPACA_API_KEY")
 ALPACA_SECRET_KEY = os.getenv("ALPACA_SECRET_KEY")
 ALPACA_ENDPOINT = os.getenv("ALPACA_ENDPOINT", "https://paper-api.alpaca.markets/v2")
 
+# Request URLs and headers built once; callers append or format in the symbol
+FINNHUB_QUOTE_URL = f"https://finnhub.io/api/v1/quote?token={FINNHUB_API_KEY}&symbol="
+FINNHUB_PROFILE_URL = f"https://finnhub.io/api/v1/stock/profile2?token={FINNHUB_API_KEY}&symbol="
+YAHOO_QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote?symbols="
+POLYGON_PREV_URL = "https://api.polygon.io/v2/aggs/ticker/{}/prev?apikey=" + str(POLYGON_API_KEY)
+ALPACA_QUOTE_URL = ALPACA_ENDPOINT + "/stocks/{}/quotes/latest"
+ALPACA_HEADERS = {
+    "APCA-API-KEY-ID": ALPACA_API_KEY or "",
+    "APCA-API-SECRET-KEY": ALPACA_SECRET_KEY or "",
+}
+
 # Caches with memory optimization for Fly.io free tier
-price_cache: dict[str, tuple[float, float]] = {}
+# Both caches are kept in least- to most-recently-used order
+price_cache: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
 CACHE_TTL = int(os.getenv("PRICE_CACHE_TTL", "86400"))
+# How long past CACHE_TTL an expired price may still be shown while refreshing
+STALE_PRICE_TTL = int(os.getenv("STALE_PRICE_TTL", "604800"))
+REVALIDATE_TIMEOUT = float(os.getenv("REVALIDATE_TIMEOUT", "2"))
+# How long a price provider may go unanswered before the next fallback also starts
+PROVIDER_HEDGE_DELAY = float(os.getenv("PROVIDER_HEDGE_DELAY", "1"))
 MIN_REQUEST_INTERVAL = float(os.getenv("MIN_REQUEST_INTERVAL", "2"))
+# Cap on provider requests in flight at once during batched lookups
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "20"))
+# Tighter cap for Finnhub, whose 429s trigger a global backoff
+MAX_CONCURRENT_FINNHUB = int(os.getenv("MAX_CONCURRENT_FINNHUB", "4"))
 # Limit cache size to save memory (free tier has only 256MB RAM)
 MAX_CACHE_SIZE = int(os.getenv("MAX_PRICE_CACHE_SIZE", "1000"))
-last_request_time = 0.0
+# Symbols no provider or database row could price (typos, delisted tickers),
+# mapped to when that was found, in least- to most-recently-used order
+_negative_prices: "OrderedDict[str, float]" = OrderedDict()
+NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", "300"))
+MAX_NEGATIVE_CACHE_SIZE = 512
+# When each symbol last went to the providers, in least- to most-recently-used
+# order. Only background revalidations are throttled, and per symbol, so a
+# batch of different tickers isn't cut off after its first request and a
+# trade always gets a real quote; overall load is bounded by the semaphores.
+_last_fetch_at: "OrderedDict[str, float]" = OrderedDict()
 backoff_until = 0.0
 rate_limit_until = 0.0
 
-company_name_cache: dict[str, tuple[str, float]] = {}
+company_name_cache: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
 COMPANY_CACHE_TTL = int(os.getenv("COMPANY_CACHE_TTL", "86400"))
 MAX_COMPANY_CACHE_SIZE = int(os.getenv("MAX_COMPANY_CACHE_SIZE", "500"))
 
+# Cleared while preload_price_cache runs so cache misses can wait for it
+_cache_warm = asyncio.Event()
+_cache_warm.set()
+
+_request_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+_finnhub_semaphore = asyncio.Semaphore(MAX_CONCURRENT_FINNHUB)
+
+# In-flight fetches keyed by symbol so concurrent cache misses share one request
+_inflight_prices: dict[str, "asyncio.Task[float | None]"] = {}
+_inflight_revalidations: dict[str, "asyncio.Task[float | None]"] = {}
+_inflight_names: dict[str, "asyncio.Task[str]"] = {}
+
+# get_price outcomes, for tuning CACHE_TTL/STALE_PRICE_TTL against API usage
+cache_stats = {"fresh": 0, "stale": 0, "miss": 0}
+
+# Fetched prices and company names waiting to be written in one batch
+PRICE_WRITE_DELAY = float(os.getenv("PRICE_WRITE_DELAY", "1"))
+_pending_price_writes: dict[str, float] = {}
+_pending_name_writes: dict[str, str] = {}
+_write_task: asyncio.Task | None = None
+
+# Shared HTTP session so API calls reuse pooled keep-alive connections
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=10)
+# Market data calls get a tighter budget so a stalled provider fails over quickly
+PROVIDER_TIMEOUT = aiohttp.ClientTimeout(
+    total=float(os.getenv("PROVIDER_TIMEOUT", "3")),
+    connect=float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "1")),
+)
+_http_session: aiohttp.ClientSession | None = None
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it on first use."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=10,
+                ttl_dns_cache=300,
+                keepalive_timeout=75,
+            ),
+            timeout=HTTP_TIMEOUT,
+        )
+    return _http_session
+
+async def close_http_session() -> None:
+    """Close the shared HTTP session if it is open."""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+def _start_writer() -> None:
+    """Start the batched writer unless one is already running."""
+    global _write_task
+    if _write_task is None or _write_task.done():
+        _write_task = asyncio.create_task(_write_queued())
+
+def _queue_price_write(symbol: str, price: float) -> None:
+    """Queue a fetched price for the next batched last_price write."""
+    _pending_price_writes[symbol] = price
+    _start_writer()
+
+def _queue_name_write(symbol: str, name: str) -> None:
+    """Queue a fetched company name for the next batched company_name write."""
+    _pending_name_writes[symbol] = name
+    _start_writer()
+
+async def _write_queued() -> None:
+    """Flush queued prices and names every PRICE_WRITE_DELAY seconds until both queues are empty."""
+    while _pending_price_writes or _pending_name_writes:
+        await asyncio.sleep(PRICE_WRITE_DELAY)
+        prices = list(_pending_price_writes.items())
+        names = list(_pending_name_writes.items())
+        _pending_price_writes.clear()
+        _pending_name_writes.clear()
+        try:
+            # One transaction and one executemany per table for the whole batch
+            async with transaction() as db:
+                if prices:
+                    await update_last_prices(db, prices)
+                if names:
+                    await update_company_names(db, names)
+        except asyncio.CancelledError:
+            # The transaction rolled back; requeue the batch without
+            # overwriting anything fetched since the snapshot
+            for symbol, price in prices:
+                _pending_price_writes.setdefault(symbol, price)
+            for symbol, name in names:
+                _pending_name_writes.setdefault(symbol, name)
+            raise
+        except Exception as e:
+            print(f"⚠️ Failed to save {len(prices)} cached prices and {len(names)} company names: {e}")
+
 async def persist_price_cache() -> None:
     """Store cached prices in the database."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        for symbol, (price, _) in price_cache.items():
-            await update_last_price(db, symbol, price)
-        await db.commit()
-
-def _cleanup_old_cache_entries() -> None:
-    """Remove old entries from caches to save memory (LRU-style cleanup)."""
-    current_time = time.time()
-    
-    # Clean price cache
-    if len(price_cache) > MAX_CACHE_SIZE:
-        # Remove oldest 20% of entries when cache is full
-        items_to_remove = len(price_cache) - int(MAX_CACHE_SIZE * 0.8)
-        sorted_items = sorted(price_cache.items(), key=lambda x: x[1][1])  # Sort by timestamp
-        for symbol, _ in sorted_items[:items_to_remove]:
-            del price_cache[symbol]
+    # Wait for a cancelled writer to requeue its in-flight batch, then write
+    # the full price cache and every queued name in one transaction
+    if _write_task is not None and not _write_task.done():
+        _write_task.cancel()
+        try:
+            await _write_task
+        except asyncio.CancelledError:
+            pass
+    _pending_price_writes.clear()
+    names = list(_pending_name_writes.items())
+    _pending_name_writes.clear()
+    rows = [(symbol, price, ts) for symbol, (price, ts) in price_cache.items()]
+    async with transaction() as db:
+        await update_last_prices_at(db, rows)
+        if names:
+            await update_company_names(db, names)
+
+def _cache_put(cache: OrderedDict, max_size: int, key: str, value: Any) -> None:
+    """Store a cache entry as most recently used, evicting the least recently used past max_size."""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
+
+def _throttled(symbol: str) -> bool:
+    """
+    Return True if the symbol went to the providers within MIN_REQUEST_INTERVAL.
     
-    # Clean company name cache  
-    if len(company_name_cache) > MAX_COMPANY_CACHE_SIZE:
-        items_to_remove = len(company_name_cache) - int(MAX_COMPANY_CACHE_SIZE * 0.8)
-        sorted_items = sorted(company_name_cache.items(), key=lambda x: x[1][1])
-        for symbol, _ in sorted_items[:items_to_remove]:
-            del company_name_cache[symbol]
+    Otherwise the attempt is recorded and False is returned, so the caller
+    may go ahead with its provider request.
+    """
+    now = time.time()
+    last = _last_fetch_at.get(symbol)
+    if last is not None and now - last < MIN_REQUEST_INTERVAL:
+        return True
+    _cache_put(_last_fetch_at, MAX_CACHE_SIZE, symbol, now)
+    return False
+
+def _finnhub_rate_limited() -> bool:
+    """Return True while a Finnhub 429 backoff is in effect."""
+    return time.time() < max(backoff_until, rate_limit_until)
 
 async def get_price_finnhub(symbol: str) -> float | None:
     """Fetch the latest price from Finnhub."""
-    url = f"https://finnhub.io/api/v1/quote?symbol={symbol.upper()}&token={FINNHUB_API_KEY}"
+    url = FINNHUB_QUOTE_URL + symbol
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200 and 'application/json' in resp.headers.get('content-type', '').lower():
-                    data = await resp.json()
+        async with _finnhub_semaphore:
+            # A 429 may have arrived while this call waited for a slot
+            if _finnhub_rate_limited():
+                return None
+            session = await get_http_session()
+            async with session.get(url, timeout=PROVIDER_TIMEOUT) as resp:
+                # A non-JSON body (e.g. an HTML error page) fails to parse and
+                # falls through to None like any other provider error
+                if resp.status == 200:
+                    data = orjson.loads(await resp.read())
                     price = data.get("c")
                     if price and price > 0:
                         return price
@@ -123,17 +299,17 @@ async def get_price_finnhub(symbol: str) -> float | None:
 
 async def get_price_yfinance(symbol: str) -> float | None:
     """Fetch the latest price from Yahoo Finance."""
-    url = f"https://query1.finance.yahoo.com/v7/finance/quote?symbols={symbol}"
+    url = YAHOO_QUOTE_URL + symbol
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200 and 'application/json' in resp.headers.get('content-type', '').lower():
-                    data = await resp.json()
-                    result = data.get("quoteResponse", {}).get("result", [])
-                    if result:
-                        price = result[0].get("regularMarketPrice")
-                        if price and price > 0:
-                            return price
+        session = await get_http_session()
+        async with session.get(url, timeout=PROVIDER_TIMEOUT) as resp:
+            if resp.status == 200:
+                data = orjson.loads(await resp.read())
+                result = data.get("quoteResponse", {}).get("result", [])
+                if result:
+                    price = result[0].get("regularMarketPrice")
+                    if price and price > 0:
+                        return price
     except Exception:
         pass
     return None
@@ -142,17 +318,17 @@ async def get_price_polygon(symbol: str) -> float | None:
     """Fetch the latest price from Polygon."""
     if not POLYGON_API_KEY:
         return None
-    url = f"https://api.polygon.io/v2/aggs/ticker/{symbol}/prev?apikey={POLYGON_API_KEY}"
+    url = POLYGON_PREV_URL.format(symbol)
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200 and 'application/json' in resp.headers.get('content-type', '').lower():
-                    data = await resp.json()
-                    results = data.get("results", [])
-                    if results:
-                        price = results[0].get("c")
-                        if price and price > 0:
-                            return price
+        session = await get_http_session()
+        async with session.get(url, timeout=PROVIDER_TIMEOUT) as resp:
+            if resp.status == 200:
+                data = orjson.loads(await resp.read())
+                results = data.get("results", [])
+                if results:
+                    price = results[0].get("c")
+                    if price and price > 0:
+                        return price
     except Exception:
         pass
     return None
@@ -161,107 +337,283 @@ async def get_price_alpaca(symbol: str) -> float | None:
     """Fetch the latest price from Alpaca."""
     if not ALPACA_API_KEY or not ALPACA_SECRET_KEY:
         return None
-    url = f"{ALPACA_ENDPOINT}/stocks/{symbol}/quotes/latest"
-    headers = {
-        "APCA-API-KEY-ID": ALPACA_API_KEY,
-        "APCA-API-SECRET-KEY": ALPACA_SECRET_KEY,
-    }
+    url = ALPACA_QUOTE_URL.format(symbol)
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200 and 'application/json' in resp.headers.get('content-type', '').lower():
-                    data = await resp.json()
-                    quote = data.get("quote", {})
-                    bid = quote.get("bp", 0)
-                    ask = quote.get("ap", 0)
-                    if bid > 0 and ask > 0:
-                        return (bid + ask) / 2
+        session = await get_http_session()
+        async with session.get(url, headers=ALPACA_HEADERS, timeout=PROVIDER_TIMEOUT) as resp:
+            if resp.status == 200:
+                data = orjson.loads(await resp.read())
+                quote = data.get("quote", {})
+                bid = quote.get("bp", 0)
+                ask = quote.get("ap", 0)
+                if bid > 0 and ask > 0:
+                    return (bid + ask) / 2
     except Exception:
         pass
     return None
 
-async def get_price(symbol: str) -> float | None:
-    """Return the best available price using API fallbacks and cache."""
-    global last_request_time, backoff_until, rate_limit_until
+def _fresh_cached_price(symbol: str) -> float | None:
+    """Return the cached price for a symbol if it is still within CACHE_TTL."""
+    cached = price_cache.get(symbol)
+    if cached and time.time() - cached[1] < CACHE_TTL:
+        price_cache.move_to_end(symbol)
+        return cached[0]
+    return None
+
+def _start_fetch(symbol: str, revalidate: bool = False) -> "asyncio.Task[float | None]":
+    """Return the in-flight fetch for a symbol, starting one if none is running."""
+    inflight = _inflight_revalidations if revalidate else _inflight_prices
+    task = inflight.get(symbol)
+    if task is None:
+        task = asyncio.create_task(_revalidate_price(symbol) if revalidate else _fetch_price(symbol))
+        inflight[symbol] = task
+        task.add_done_callback(lambda t: inflight.pop(symbol, None))
+    return task
+
+async def get_price(symbol: str, allow_stale: bool = False) -> float | None:
+    """
+    Return the best available price using API fallbacks and cache.
+    
+    Args:
+        symbol: Stock ticker
+        allow_stale: Serve an expired cached price (up to STALE_PRICE_TTL past
+            expiry) immediately and refresh it in the background. Meant for
+            display-only lookups; trades should always wait for a fresh quote.
+    """
+    # Normalized once here; providers, cache keys and DB writes reuse it as-is
     symbol = symbol.upper()
-    now = time.time()
     
     # Check cache first
-    if symbol in price_cache:
-        price, ts = price_cache[symbol]
-        if now - ts < CACHE_TTL:
+    price = _fresh_cached_price(symbol)
+    if price is not None:
+        cache_stats["fresh"] += 1
+        return price
+    
+    # A miss during startup may be served by the preload still in progress
+    if not _cache_warm.is_set():
+        await _cache_warm.wait()
+        price = _fresh_cached_price(symbol)
+        if price is not None:
+            cache_stats["fresh"] += 1
             return price
     
-    # Rate limiting check
-    if now - last_request_time < MIN_REQUEST_INTERVAL:
+    # Recently unpriceable symbols aren't sent back through every provider
+    failed_at = _negative_prices.get(symbol)
+    if failed_at is not None and symbol not in price_cache:
+        if time.time() - failed_at < NEGATIVE_CACHE_TTL:
+            cache_stats["miss"] += 1
+            return None
+        del _negative_prices[symbol]
+    
+    # Stale-while-revalidate: answer from the expired entry, refresh off the critical path
+    if allow_stale:
         cached = price_cache.get(symbol)
-        if cached:
+        if cached and time.time() - cached[1] < CACHE_TTL + STALE_PRICE_TTL:
+            cache_stats["stale"] += 1
+            _start_fetch(symbol, revalidate=True)
             return cached[0]
-        return await get_last_price_from_db(symbol)
     
-    # Memory optimization: cleanup cache if needed
-    _cleanup_old_cache_entries()
+    cache_stats["miss"] += 1
+    # Concurrent misses for the same symbol await the same fetch and its result.
+    # Shielded so one caller being cancelled doesn't abort the fetch for the rest
+    return await asyncio.shield(_start_fetch(symbol))
+
+async def _call_provider(provider, symbol: str) -> float | None:
+    """Run one price provider, recording a Finnhub 429 as a global backoff."""
+    global backoff_until, rate_limit_until
+    try:
+        async with _request_semaphore:
+            return await provider(symbol)
+    except aiohttp.ClientResponseError as e:
+        if e.status == 429 and provider is get_price_finnhub:
+            retry_after = e.headers.get("retry-after") if e.headers else None
+            wait = float(retry_after) if retry_after else 60
+            backoff_until = rate_limit_until = time.time() + wait
+    except Exception:
+        pass
+    return None
+
+async def _first_price(symbol: str, providers: list) -> float | None:
+    """
+    Return the first valid price from providers, hedging slow ones.
+    
+    Providers start in priority order. The next one starts as soon as every
+    running request has failed, or after PROVIDER_HEDGE_DELAY seconds
+    without an answer, so one hung connection can't hold up the fallbacks.
+    Requests still running once a price arrives are cancelled.
+    """
+    queue = list(providers)
+    pending: set[asyncio.Task] = set()
+    try:
+        while queue or pending:
+            if queue:
+                pending.add(asyncio.create_task(_call_provider(queue.pop(0), symbol)))
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=PROVIDER_HEDGE_DELAY if queue else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                price = task.result()
+                if price and price > 0:
+                    return price
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _revalidate_price(symbol: str) -> float | None:
+    """
+    Refresh a stale cached price with one quick provider call.
     
-    finnhub_ok = now >= max(backoff_until, rate_limit_until)
-    last_request_time = time.time()
+    The caller has already been answered from the cache, so instead of the
+    full provider waterfall this tries only the primary provider, bounded by
+    REVALIDATE_TIMEOUT, and keeps the cached value on any failure.
+    """
+    cached = price_cache.get(symbol)
+    if _throttled(symbol):
+        return cached[0] if cached else None
+    
+    finnhub_ok = FINNHUB_API_KEY and not _finnhub_rate_limited()
+    provider = get_price_finnhub if finnhub_ok else get_price_yfinance
+    try:
+        price = await asyncio.wait_for(_call_provider(provider, symbol), REVALIDATE_TIMEOUT)
+    except asyncio.TimeoutError:
+        price = None
+    if price and price > 0:
+        _cache_put(price_cache, MAX_CACHE_SIZE, symbol, (price, time.time()))
+        _queue_price_write(symbol, price)
+        return price
+    return cached[0] if cached else None
+
+async def _fetch_price(symbol: str) -> float | None:
+    """Fetch a price from the providers, falling back to cache or database."""
+    # Never throttled: these callers (trades included) need a live quote. The
+    # attempt is recorded so background revalidations of the symbol back off.
+    _cache_put(_last_fetch_at, MAX_CACHE_SIZE, symbol, time.time())
+    
+    finnhub_ok = not _finnhub_rate_limited()
     providers = []
     if finnhub_ok and FINNHUB_API_KEY:
         providers.append(get_price_finnhub)
     providers.append(get_price_yfinance)
-    providers.append(get_price_polygon)
-    providers.append(get_price_alpaca)
+    # Providers without credentials would only return None; leave them out
+    if POLYGON_API_KEY:
+        providers.append(get_price_polygon)
+    if ALPACA_API_KEY and ALPACA_SECRET_KEY:
+        providers.append(get_price_alpaca)
     
-    for provider in providers:
-        try:
-            price = await provider(symbol)
-            if price and price > 0:
-                price_cache[symbol] = (price, time.time())
-                async with aiosqlite.connect(DB_NAME) as db:
-                    await update_last_price(db, symbol, price)
-                    await db.commit()
-                return price
-        except aiohttp.ClientResponseError as e:
-            if e.status == 429 and provider is get_price_finnhub:
-                retry_after = e.headers.get("retry-after") if e.headers else None
-                wait = float(retry_after) if retry_after else 60
-                backoff_until = rate_limit_until = time.time() + wait
-        except Exception:
-            pass
+    price = await _first_price(symbol, providers)
+    if price:
+        _cache_put(price_cache, MAX_CACHE_SIZE, symbol, (price, time.time()))
+        _queue_price_write(symbol, price)
+        return price
     
     # Fallback to cache or database
     cached = price_cache.get(symbol)
     if cached:
         return cached[0]
-    return await get_last_price_from_db(symbol)
+    price = await get_last_price_from_db(symbol)
+    if price is None:
+        _cache_put(_negative_prices, MAX_NEGATIVE_CACHE_SIZE, symbol, time.time())
+    return price
+
+async def _rehydrate(cache: OrderedDict, max_size: int, symbols: Sequence[str], load) -> None:
+    """
+    Reload symbols evicted from an in-memory cache with one database query.
+    
+    Without this every evicted ticker in a batch would fall through to its
+    own provider call or single-row database lookup.
+    """
+    missing = [symbol for symbol in map(str.upper, symbols) if symbol not in cache]
+    if not missing:
+        return
+    stored = await load(missing)
+    # Oldest first so the most recently updated entries end up most recently used
+    for symbol, entry in sorted(stored.items(), key=lambda item: item[1][1]):
+        _cache_put(cache, max_size, symbol, entry)
+
+async def get_prices(symbols: Iterable[str], allow_stale: bool = False) -> dict[str, float | None]:
+    """Return prices for many symbols, fetching each distinct ticker concurrently."""
+    unique = list(dict.fromkeys(symbols))
+    await ensure_warm()
+    await _rehydrate(price_cache, MAX_CACHE_SIZE, unique, get_last_prices_from_db)
+    results = await asyncio.gather(*(get_price(symbol, allow_stale) for symbol in unique))
+    return dict(zip(unique, results))
+
+async def get_company_names(symbols: Iterable[str]) -> dict[str, str]:
+    """Return company names for many symbols, looking up each distinct ticker concurrently."""
+    unique = list(dict.fromkeys(symbols))
+    await _rehydrate(company_name_cache, MAX_COMPANY_CACHE_SIZE, unique, get_company_names_from_db)
+    results = await asyncio.gather(*(get_company_name(symbol) for symbol in unique))
+    return dict(zip(unique, results))
+
+def holdings_values(
+    portfolios: Sequence[tuple[Any, ...]], prices: dict[str, float | None]
+) -> np.ndarray:
+    """
+    Return the market value of each portfolio's holdings in one reduction.
+    
+    Args:
+        portfolios: Rows from get_all_portfolios(); the last item of each
+            row is its list of (symbol, shares) pairs
+        prices: Price lookup from get_prices(); missing prices count as 0
+    
+    Returns:
+        Array of holdings values aligned with portfolios
+    """
+    owners: list[int] = []
+    shares: list[int] = []
+    quotes: list[float] = []
+    for i, row in enumerate(portfolios):
+        for symbol, quantity in row[-1]:
+            owners.append(i)
+            shares.append(quantity)
+            quotes.append(prices.get(symbol) or 0.0)
+    weights = np.multiply(shares, quotes, dtype=float)
+    return np.bincount(
+        np.asarray(owners, dtype=np.intp), weights=weights, minlength=len(portfolios)
+    )
 
 async def get_company_name(symbol: str) -> str:
     """Return the company name for a stock symbol."""
     symbol = symbol.upper()
-    now = time.time()
     
     # Check cache first
-    if symbol in company_name_cache:
-        name, ts = company_name_cache[symbol]
-        if now - ts < COMPANY_CACHE_TTL:
-            return name
+    cached = company_name_cache.get(symbol)
+    if cached and time.time() - cached[1] < COMPANY_CACHE_TTL:
+        company_name_cache.move_to_end(symbol)
+        return cached[0]
     
-    # Rate limiting check
-    if now < max(backoff_until, rate_limit_until):
-        cached = company_name_cache.get(symbol)
+    # Rate limiting check; repeated after waiting for a Finnhub slot
+    if _finnhub_rate_limited():
         return cached[0] if cached else symbol
     
-    # Memory optimization: cleanup cache if needed
-    _cleanup_old_cache_entries()
-    
-    url = f"https://finnhub.io/api/v1/stock/profile2?symbol={symbol}&token={FINNHUB_API_KEY}"
+    # Concurrent misses for the same symbol share one profile request
+    task = _inflight_names.get(symbol)
+    if task is None:
+        task = asyncio.create_task(_fetch_company_name(symbol))
+        _inflight_names[symbol] = task
+        task.add_done_callback(lambda t: _inflight_names.pop(symbol, None))
+    return await asyncio.shield(task)
+
+async def _fetch_company_name(symbol: str) -> str:
+    """Fetch a company name from Finnhub, falling back to the cached name or the symbol."""
+    now = time.time()
+    url = FINNHUB_PROFILE_URL + symbol
+    fetched: str | None = None
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200 and 'application/json' in resp.headers.get('content-type', '').lower():
-                    data = await resp.json()
-                    name = data.get("name", symbol)
-                    company_name_cache[symbol] = (name, now)
-                    return name
+        async with _finnhub_semaphore:
+            if not _finnhub_rate_limited():
+                session = await get_http_session()
+                async with session.get(url, timeout=PROVIDER_TIMEOUT) as resp:
+                    if resp.status == 200:
+                        data = orjson.loads(await resp.read())
+                        fetched = data.get("name", symbol)
+        if fetched is not None:
+            _cache_put(company_name_cache, MAX_COMPANY_CACHE_SIZE, symbol, (fetched, now))
+            _queue_name_write(symbol, fetched)
+            return fetched
     except Exception:
         pass
     
@@ -270,18 +622,28 @@ async def get_company_name(symbol: str) -> str:
 
 async def preload_price_cache() -> None:
     """Load cached prices from the database into memory."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute("SELECT symbol, price, last_updated FROM last_price") as cur:
-            rows = await cur.fetchall()
-        for symbol, price, last_updated in rows:
-            try:
-                dt = datetime.fromisoformat(last_updated.replace('Z', '+00:00'))
-                ts = dt.timestamp()
-                price_cache[symbol.upper()] = (price, ts)
-            except Exception:
-                continue
-
-async def clear_price_cache() -> None:
+    _cache_warm.clear()
+    try:
+        db = await get_read_db()
+        rows = await db.execute_fetchall(SEL_PRICE_CACHE)
+        for symbol, price, ts in rows:
+            _cache_put(price_cache, MAX_CACHE_SIZE, symbol, (price, ts))
+    finally:
+        _cache_warm.set()
+
+async def preload_company_name_cache() -> None:
+    """Load persisted company names from the database into memory."""
+    db = await get_read_db()
+    rows = await db.execute_fetchall(SEL_COMPANY_NAME_CACHE)
+    for symbol, name, ts in rows:
+        _cache_put(company_name_cache, MAX_COMPANY_CACHE_SIZE, symbol, (name, ts))
+
+async def ensure_warm() -> None:
+    """Wait for any in-progress preload_price_cache to finish."""
+    await _cache_warm.wait()
+
+def clear_price_cache() -> None:
     """Remove all items from the in-memory price cache."""
     price_cache.clear()
+    _negative_prices.clear()
 
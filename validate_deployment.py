@@ -15,7 +15,10 @@ async def validate_database():
     print("🗄️  Validating Database...")
     
     try:
-        conn = sqlite3.connect('trading_game.db')
+        # Read-only: a missing file fails the check instead of being created
+        # empty, and validation never contends for the bot's write lock
+        conn = sqlite3.connect('file:trading_game.db?mode=ro', uri=True)
+        conn.execute("PRAGMA busy_timeout=5000")
         
         # Check tables exist
         tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()